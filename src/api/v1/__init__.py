@@ -1,17 +1,97 @@
 from functools import lru_cache
-from typing import Optional
+from http import HTTPStatus
+from typing import Callable, Generic, Optional, Type, TypeVar
 from uuid import UUID
 
-from fastapi import Query
+from fastapi import HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
+from pydantic.generics import GenericModel
+
+from api.v1.messages import INVALID_CURSOR, UNKNOWN_FIELDS
+from api.v1.projection import projection
+from core.config import MAX_PAGE_SIZE
+from services.base import BaseService
+from services.cursors import CursorError
+
+ItemT = TypeVar("ItemT")
 
 
 @lru_cache()
 def get_page_params(
-    size: int = Query(50, alias="page[size]"),
-    number: int = Query(1, alias="page[number]"),
+    size: int = Query(50, alias="page[size]", ge=1, le=MAX_PAGE_SIZE),
+    number: int = Query(1, alias="page[number]", ge=1),
+    after: Optional[str] = Query(
+        None,
+        alias="page[after]",
+        description="cursor from `next` of previous page, empty for the first one",
+    ),
 ):
-    return {"size": size, "number": number}
+    return {"size": size, "number": number, "after": after}
+
+
+def search_query(required: bool = False) -> Callable:
+    """
+    Dependency reading `query` with runs of whitespace collapsed, so queries
+    differing only in spacing are searched and cached as one. Case is kept:
+    keyword fields match it as it is.
+    """
+
+    def get_query(query: Optional[str] = Query(... if required else None)):
+        return None if query is None else " ".join(query.split())
+
+    return get_query
+
+
+get_search_query = search_query()
+get_required_search_query = search_query(required=True)
+
+
+class CursorPage(GenericModel, Generic[ItemT]):
+    items: list[ItemT]
+    next: Optional[str] = None
+
+
+async def paginate(
+    service: BaseService,
+    page: dict,
+    model: Type[BaseModel],
+    result_class: Optional[Type[BaseModel]] = None,
+    fields: Optional[tuple[str, ...]] = None,
+    **kwargs,
+) -> ORJSONResponse:
+    """
+    Page by page[number], or by page[after] cursor if it is given.
+    Cursor pages are wrapped into CursorPage to pass the next cursor.
+    Items are projected into `model` (only its `fields` if given) right from
+    documents and serialized once, so response_model only describes the schema.
+    """
+    result_class = result_class or service.result_class
+    project = projection(model, result_class, fields)
+    if page["after"] is None:
+        sources = await service.get_by(
+            page_number=page["number"],
+            page_size=page["size"],
+            result_class=result_class,
+            parse=False,
+            fields=fields,
+            **kwargs,
+        )
+        return ORJSONResponse([project(source) for source in sources])
+    try:
+        sources, next_cursor = await service.get_by_cursor(
+            after=page["after"],
+            page_size=page["size"],
+            result_class=result_class,
+            parse=False,
+            fields=fields,
+            **kwargs,
+        )
+    except CursorError:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=INVALID_CURSOR)
+    return ORJSONResponse(
+        {"items": [project(source) for source in sources], "next": next_cursor}
+    )
 
 
 class GenrePartial(BaseModel):
@@ -39,3 +119,37 @@ class FilmFullInfo(PartialFilmInfo):
 
     class Config:
         fields = {"genre": "genres"}
+
+
+def sparse_fields(type_: str, model: Type[BaseModel]) -> Callable:
+    """
+    Dependency reading `fields[type_]`, comma separated fields of `model`
+    to return. Gives sorted field names with uuid, None for all fields.
+    """
+    allowed = {field.alias for field in model.__fields__.values()}
+
+    def get_fields(
+        fields: Optional[str] = Query(
+            None,
+            alias="fields[{t}]".format(t=type_),
+            description="comma separated fields to return, all by default",
+        ),
+    ) -> Optional[tuple[str, ...]]:
+        if fields is None:
+            return None
+        names = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = names - allowed
+        if unknown:
+            raise HTTPException(
+                status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+                detail=UNKNOWN_FIELDS.format(fields=", ".join(sorted(unknown))),
+            )
+        return tuple(sorted(names | {"uuid"}))
+
+    return get_fields
+
+
+get_film_fields = sparse_fields("film", FilmFullInfo)
+get_partial_film_fields = sparse_fields("film", PartialFilmInfo)
+get_genre_fields = sparse_fields("genre", GenrePartial)
+get_person_fields = sparse_fields("person", PersonPartial)
@@ -0,0 +1,87 @@
+import logging
+from http import HTTPStatus
+from typing import Optional, Type
+from uuid import UUID
+
+import orjson
+from aioredis import Redis
+from aioredis.exceptions import RedisError
+from fastapi import HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi_cache import FastAPICache
+from pydantic import BaseModel
+
+from api.v1.messages import INVALID_IDS, TOO_MANY_IDS
+from core.config import BATCH_MAX_IDS, REDIS_CACHE_EXPIRE
+from db.versions import index_versions
+from services.base import BaseService
+
+logger = logging.getLogger(__name__)
+
+
+def get_batch_ids(
+    ids: str = Query(..., description="comma separated uuids"),
+) -> list[UUID]:
+    try:
+        parsed = [UUID(id_.strip()) for id_ in ids.split(",") if id_.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=HTTPStatus.UNPROCESSABLE_ENTITY, detail=INVALID_IDS
+        )
+    if len(parsed) > BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=HTTPStatus.UNPROCESSABLE_ENTITY, detail=TOO_MANY_IDS
+        )
+    return parsed
+
+
+async def get_batch(
+    request: Request,
+    redis: Redis,
+    service: BaseService,
+    ids: list[UUID],
+    model: Type[BaseModel],
+    namespace: str,
+    result_class: Optional[Type[BaseModel]] = None,
+) -> list[Optional[dict]]:
+    """
+    Items of `model` in order of ids, None for unknown ones.
+    Every item is cached on its own: cached ones are read with one MGET,
+    the rest is fetched with one storage request and cached.
+    """
+    prefix = "{p}:batch:{n}:{v}".format(
+        p=FastAPICache.get_prefix(),
+        n=namespace,
+        v=index_versions.get(service.index_name),
+    )
+    keys = ["{p}:{i}".format(p=prefix, i=id_) for id_ in ids]
+    cached = [None] * len(ids)
+    if request.headers.get("Cache-Control") != "no-store" and ids:
+        try:
+            cached = await redis.mget(keys)
+        except RedisError as e:
+            logger.warning("batch cache read failed: %s", e)
+
+    out = [None if raw is None else orjson.loads(raw) for raw in cached]
+    missing = list(dict.fromkeys(id_ for id_, raw in zip(ids, cached) if raw is None))
+    if not missing:
+        return out
+
+    entities = await service.get_by_ids(missing, result_class=result_class)
+    fetched = {
+        id_: None if entity is None else jsonable_encoder(model(**entity.dict()))
+        for id_, entity in zip(missing, entities)
+    }
+    for i, id_ in enumerate(ids):
+        if cached[i] is None:
+            out[i] = fetched[id_]
+
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for key, id_ in dict(zip(keys, ids)).items():
+                if fetched.get(id_) is not None:
+                    pipe.set(key, orjson.dumps(fetched[id_]), ex=REDIS_CACHE_EXPIRE)
+            await pipe.execute()
+    except RedisError as e:
+        logger.warning("batch cache write failed: %s", e)
+    return out
@@ -0,0 +1,252 @@
+import asyncio
+import inspect
+import logging
+from functools import wraps
+from hashlib import md5
+from time import time
+from typing import Any, Callable, Optional
+from uuid import UUID
+
+import orjson
+from aioredis.exceptions import RedisError
+from fastapi import Request, Response
+from fastapi_cache import FastAPICache
+
+from api.v1.codec import CachedBody
+from core.config import (
+    CACHE_HARD_TTL,
+    CACHE_REFRESH_LOCK_TIMEOUT,
+    CACHE_SOFT_TTL,
+    CLIENT_CACHE_MAX_AGE,
+    REDIS_CACHE_EXPIRE,
+)
+from core.metrics import metrics
+from core.warmer import WARMER_HEADER, access_log
+from db import redis
+from db.locks import RedisLock
+from db.versions import index_versions
+from services.base import BaseService
+
+logger = logging.getLogger(__name__)
+
+CACHE_STATUS_HEADER = "X-Cache-Status"
+
+_refreshing: dict[str, asyncio.Task] = {}
+
+
+def _canonical(value: Any) -> Any:
+    # uuid params are typed, so they come parsed; strings are kept as they
+    # are, handlers send them to storage unchanged
+    if isinstance(value, dict):
+        return {k: _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def canonical_key_builder(
+    func,
+    namespace: Optional[str] = "",
+    request: Optional[Request] = None,
+    response: Optional[Response] = None,
+    args: Optional[tuple] = None,
+    kwargs: Optional[dict] = None,
+) -> str:
+    """
+    Cache key of resolved handler params, so that equivalent requests share
+    an entry: params are sorted, defaults are filled in and search queries
+    are normalized by dependencies, uuids are canonical. Services are
+    replaced with data versions of their indices.
+    """
+    params, versions = {}, {}
+    for name, value in (kwargs or {}).items():
+        if isinstance(value, BaseService):
+            versions[value.index_name] = index_versions.get(value.index_name)
+        elif value is None or isinstance(
+            value, (str, int, float, bool, UUID, dict, list, tuple)
+        ):
+            params[name] = _canonical(value)
+    digest = md5(
+        orjson.dumps(
+            [func.__module__, func.__name__, params, versions],
+            option=orjson.OPT_SORT_KEYS,
+        )
+    ).hexdigest()
+    return "{p}:{n}:{d}".format(p=FastAPICache.get_prefix(), n=namespace, d=digest)
+
+
+def _with_params(func: Callable, *names_types) -> inspect.Signature:
+    """Signature of func extended with keyword-only params it lacks"""
+    signature = inspect.signature(func)
+    params = list(signature.parameters.values())
+    for name, type_ in names_types:
+        if name not in signature.parameters:
+            params.append(
+                inspect.Parameter(
+                    name, inspect.Parameter.KEYWORD_ONLY, annotation=type_
+                )
+            )
+    return signature.replace(parameters=params)
+
+
+def cache(
+    expire: int = REDIS_CACHE_EXPIRE,
+    namespace: str = "",
+    key_builder: Optional[Callable] = None,
+):
+    """Caches response body for `expire` seconds"""
+    return _cache(expire, None, namespace, key_builder)
+
+
+def swr_cache(
+    soft_ttl: int = CACHE_SOFT_TTL,
+    hard_ttl: int = CACHE_HARD_TTL,
+    namespace: str = "",
+    key_builder: Optional[Callable] = None,
+):
+    """
+    Caches response body for `hard_ttl` seconds. After `soft_ttl` the cached
+    response is still served, but marked stale, and a single background task
+    (one across all workers) recomputes it.
+    X-Cache-Status header tells whether response is fresh or stale.
+    """
+    return _cache(hard_ttl, soft_ttl, namespace, key_builder)
+
+
+def _cache(
+    expire: int,
+    soft_ttl: Optional[int],
+    namespace: str,
+    key_builder: Optional[Callable],
+):
+    def wrapper(func):
+        func_params = inspect.signature(func).parameters
+
+        @wraps(func)
+        async def inner(*args, **kwargs):
+            request: Request = kwargs["request"]
+            func_kwargs = {k: v for k, v in kwargs.items() if k in func_params}
+            if (
+                request.headers.get("Cache-Control") == "no-store"
+                or not FastAPICache.get_enable()
+            ):
+                return await func(*args, **func_kwargs)
+            build_key = key_builder or FastAPICache.get_key_builder()
+            cache_key = build_key(
+                func,
+                namespace,
+                request=request,
+                args=args,
+                kwargs={k: v for k, v in func_kwargs.items() if k != "request"},
+            )
+            accept_encoding = request.headers.get("Accept-Encoding", "")
+            if_none_match = request.headers.get("If-None-Match")
+            backend = FastAPICache.get_backend()
+
+            entry = None
+            if if_none_match:
+                # conditional requests are answered from entry metadata
+                ttl, meta = await backend.get_with_ttl(_meta_key(cache_key))
+                if meta is not None:
+                    entry = CachedBody.loads_meta(meta)
+            if entry is None or not entry.not_modified(if_none_match):
+                ttl, cached = await backend.get_with_ttl(cache_key)
+                if cached is None:
+                    metrics.inc("cache.miss")
+                    entry = await _compute(cache_key, expire, func, args, func_kwargs)
+                    _record(request)
+                    response = _response(entry, if_none_match, accept_encoding)
+                    if soft_ttl is not None:
+                        response.headers[CACHE_STATUS_HEADER] = "fresh"
+                    return response
+                entry = CachedBody.loads(cached)
+
+            metrics.inc("cache.hit")
+            _record(request)
+            response = _response(entry, if_none_match, accept_encoding)
+            if soft_ttl is None:
+                response.headers["Cache-Control"] = _max_age(ttl)
+                return response
+            fresh_for = int(soft_ttl - (time() - entry.created))
+            if fresh_for > 0:
+                response.headers[CACHE_STATUS_HEADER] = "fresh"
+                response.headers["Cache-Control"] = _max_age(fresh_for)
+                metrics.inc("cache.swr.fresh")
+            else:
+                response.headers[CACHE_STATUS_HEADER] = "stale"
+                metrics.inc("cache.swr.stale")
+                _schedule_refresh(cache_key, expire, func, args, func_kwargs)
+            return response
+
+        inner.__signature__ = _with_params(func, ("request", Request))
+        return inner
+
+    return wrapper
+
+
+def _record(request: Request) -> None:
+    """Counts a request served successfully for the warmer, not its own"""
+    if WARMER_HEADER not in request.headers:
+        access_log.record(request.url.path, request.url.query)
+
+
+def _max_age(ttl: int) -> str:
+    return "max-age={t}".format(t=max(min(ttl, CLIENT_CACHE_MAX_AGE), 0))
+
+
+def _meta_key(cache_key: str) -> str:
+    return "{k}:meta".format(k=cache_key)
+
+
+def _response(
+    entry: CachedBody, if_none_match: Optional[str], accept_encoding: str
+) -> Response:
+    if if_none_match and entry.not_modified(if_none_match):
+        metrics.inc("cache.not_modified")
+        return entry.to_not_modified_response(accept_encoding)
+    return entry.to_response(accept_encoding)
+
+
+async def _compute(cache_key: str, expire: int, func, args, kwargs) -> CachedBody:
+    entry = CachedBody.from_value(await func(*args, **kwargs))
+    backend = FastAPICache.get_backend()
+    await backend.set(cache_key, entry.dumps(), expire)
+    await backend.set(_meta_key(cache_key), entry.meta(), expire)
+    return entry
+
+
+def _schedule_refresh(cache_key: str, expire: int, func, args, kwargs) -> None:
+    if cache_key in _refreshing:
+        return
+    task = asyncio.create_task(_refresh(cache_key, expire, func, args, kwargs))
+    _refreshing[cache_key] = task
+    task.add_done_callback(lambda _: _refreshing.pop(cache_key, None))
+
+
+async def _refresh(cache_key: str, expire: int, func, args, kwargs) -> None:
+    lock = RedisLock(
+        redis.redis,
+        "{k}:refresh-lock".format(k=cache_key),
+        CACHE_REFRESH_LOCK_TIMEOUT,
+    )
+    try:
+        locked = await lock.acquire()
+    except RedisError as e:
+        logger.warning("cache refresh lock failed: %s", e)
+        return
+    if not locked:
+        # another worker refreshes it
+        return
+    try:
+        await _compute(cache_key, expire, func, args, kwargs)
+        metrics.inc("cache.swr.refreshed")
+    except Exception:
+        metrics.inc("cache.swr.refresh_errors")
+        logger.exception("background refresh of %s failed", cache_key)
+    finally:
+        try:
+            await lock.release()
+        except RedisError:
+            pass
@@ -0,0 +1,116 @@
+import gzip
+from dataclasses import dataclass
+from hashlib import blake2b
+from http import HTTPStatus
+from time import time
+from typing import Any, Union
+
+import orjson
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+
+from core.config import CACHE_COMPRESS_LEVEL, CACHE_COMPRESS_MIN_SIZE
+from core.metrics import metrics
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    for coding in accept_encoding.split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00")
+    return False
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Weak comparison of If-None-Match with etag, gzip and identity
+    representations of a body are treated as the same
+    """
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip().removeprefix("W/")
+        if candidate == "*" or candidate.replace("-gzip", "") == etag:
+            return True
+    return False
+
+
+@dataclass
+class CachedBody:
+    """
+    Ready to send json body of a cached response. Stored as a one line json
+    header followed by the body, which is gzipped when it is big enough.
+    The header is also stored on its own as entry metadata, enough to answer
+    conditional requests by strong ETag, a hash of the json body.
+    """
+
+    body: bytes
+    created: float
+    gzipped: bool = False
+    etag: str = ""
+
+    @classmethod
+    def from_value(cls, value: Any) -> "CachedBody":
+        if isinstance(value, Response):
+            # handlers may return already serialized json
+            raw = value.body
+        else:
+            raw = orjson.dumps(jsonable_encoder(value))
+        metrics.observe("cache.codec.raw_bytes", len(raw))
+        etag = '"{h}"'.format(h=blake2b(raw, digest_size=16).hexdigest())
+        if len(raw) < CACHE_COMPRESS_MIN_SIZE:
+            return cls(body=raw, created=time(), etag=etag)
+        body = gzip.compress(raw, compresslevel=CACHE_COMPRESS_LEVEL, mtime=0)
+        metrics.observe("cache.codec.ratio", len(raw) / len(body))
+        return cls(body=body, created=time(), gzipped=True, etag=etag)
+
+    @classmethod
+    def loads(cls, data: Union[bytes, str]) -> "CachedBody":
+        if isinstance(data, str):
+            data = data.encode()
+        header, body = data.split(b"\n", 1)
+        metrics.observe("cache.hit_bytes", len(data))
+        return cls.loads_meta(header, body)
+
+    @classmethod
+    def loads_meta(cls, data: Union[bytes, str], body: bytes = b"") -> "CachedBody":
+        """Entry from header only, without body"""
+        header = orjson.loads(data)
+        return cls(
+            body=body,
+            created=header["c"],
+            gzipped=header["z"],
+            etag=header.get("e", ""),
+        )
+
+    def meta(self) -> bytes:
+        return orjson.dumps({"c": self.created, "z": self.gzipped, "e": self.etag})
+
+    def dumps(self) -> bytes:
+        return self.meta() + b"\n" + self.body
+
+    def _headers(self, accept_encoding: str) -> dict:
+        headers = {"Vary": "Accept-Encoding"}
+        if self.gzipped and accepts_gzip(accept_encoding):
+            headers["Content-Encoding"] = "gzip"
+        if self.etag:
+            # representations differ by encoding, so do their strong etags
+            headers["ETag"] = (
+                self.etag[:-1] + '-gzip"'
+                if "Content-Encoding" in headers
+                else self.etag
+            )
+        return headers
+
+    def to_response(self, accept_encoding: str = "") -> Response:
+        """Response with the stored body, gzipped one is sent as is if accepted"""
+        body, headers = self.body, self._headers(accept_encoding)
+        if self.gzipped and "Content-Encoding" not in headers:
+            body = gzip.decompress(body)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def not_modified(self, if_none_match: str) -> bool:
+        return bool(self.etag) and etag_matches(if_none_match, self.etag)
+
+    def to_not_modified_response(self, accept_encoding: str = "") -> Response:
+        headers = self._headers(accept_encoding)
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
@@ -0,0 +1,91 @@
+import zlib
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Optional, Type
+
+import orjson
+from fastapi import Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from api.v1.codec import accepts_gzip
+from api.v1.projection import projection
+from core.config import CACHE_COMPRESS_LEVEL
+from services.base import BaseService
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "json": "application/json"}
+
+
+def get_export_format(
+    export_format: str = Query(
+        "ndjson",
+        alias="format",
+        regex="^(ndjson|json)$",
+        description="ndjson, one document per line, or json array",
+    ),
+) -> str:
+    return export_format
+
+
+def export(
+    request: Request,
+    service: BaseService,
+    model: Type[BaseModel],
+    export_format: str,
+    result_class: Optional[Type[BaseModel]] = None,
+    fields: Optional[tuple[str, ...]] = None,
+) -> StreamingResponse:
+    """
+    Streams all documents of service index projected into `model`.
+    Documents are read from storage batch by batch as the client consumes
+    the stream, so memory is bounded by one batch. Gzipped if accepted.
+    """
+    project = projection(model, result_class or service.result_class, fields)
+    compress = accepts_gzip(request.headers.get("Accept-Encoding", ""))
+    headers = {"Vary": "Accept-Encoding"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        _chunks(
+            service.export(result_class=result_class, fields=fields),
+            project,
+            array=export_format == "json",
+            compress=compress,
+        ),
+        media_type=MEDIA_TYPES[export_format],
+        headers=headers,
+    )
+
+
+async def _chunks(
+    batches: AsyncIterator[list[dict]],
+    project: Callable[[dict], dict],
+    array: bool,
+    compress: bool,
+) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(CACHE_COMPRESS_LEVEL, zlib.DEFLATED, 31)
+
+    def encode(chunk: bytes) -> bytes:
+        return compressor.compress(chunk) if compress else chunk
+
+    # closes storage iterator (and its point in time) if client goes away
+    async with aclosing(batches):
+        if array:
+            yield encode(b"[")
+        first = True
+        async for sources in batches:
+            if array:
+                chunk = b",".join(orjson.dumps(project(src)) for src in sources)
+                chunk = chunk if first else b"," + chunk
+            else:
+                chunk = b"".join(
+                    orjson.dumps(project(src), option=orjson.OPT_APPEND_NEWLINE)
+                    for src in sources
+                )
+            first = False
+            encoded = encode(chunk)
+            if encoded:
+                yield encoded
+        if array:
+            yield encode(b"]")
+    if compress:
+        yield compressor.flush()
@@ -1,62 +1,123 @@
 from http import HTTPStatus
-from typing import Optional
+from typing import Optional, Union
 from uuid import UUID
 
+from aioredis import Redis
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
-from fastapi_cache.decorator import cache
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
-from api.v1 import FilmFullInfo, PartialFilmInfo, get_page_params
+from api.v1 import (
+    CursorPage,
+    FilmFullInfo,
+    PartialFilmInfo,
+    get_film_fields,
+    get_page_params,
+    get_partial_film_fields,
+    get_search_query,
+    paginate,
+)
+from api.v1.batch import get_batch, get_batch_ids
+from api.v1.cache import cache, swr_cache
+from api.v1.export import export, get_export_format
 from api.v1.messages import FILM_NOT_FOUND
+from api.v1.projection import projection
 from core.config import REDIS_CACHE_EXPIRE
+from db.redis import get_redis
+from models.film import BaseFilm, Film
 from services.films import FilmService, get_film_service
 
 router = APIRouter()
 
 
-@router.get("/search", response_model=list[PartialFilmInfo])
-@cache(expire=REDIS_CACHE_EXPIRE)
+@router.get(
+    "/search",
+    response_model=Union[list[PartialFilmInfo], CursorPage[PartialFilmInfo]],
+)
+@cache(expire=REDIS_CACHE_EXPIRE, namespace="film_search")
 async def film_search(
     request: Request,
-    query: Optional[str] = None,
+    query: Optional[str] = Depends(get_search_query),
     page: dict = Depends(get_page_params),
+    fields: Optional[tuple[str, ...]] = Depends(get_partial_film_fields),
     film_service: FilmService = Depends(get_film_service),
     filter_genre: Optional[UUID] = Query(None, alias="filter[genre]"),
-) -> list[PartialFilmInfo]:
-    out = await film_service.get_by(
-        page_number=page["number"],
-        page_size=page["size"],
+) -> ORJSONResponse:
+    return await paginate(
+        film_service,
+        page,
+        PartialFilmInfo,
+        result_class=BaseFilm,
         query=query,
         genre_id=filter_genre,
+        fields=fields,
     )
-    return [PartialFilmInfo(**film.dict()) for film in out]
 
 
-@router.get("", response_model=list[PartialFilmInfo])
-@cache(expire=REDIS_CACHE_EXPIRE)
+@router.get(
+    "", response_model=Union[list[PartialFilmInfo], CursorPage[PartialFilmInfo]]
+)
+@swr_cache(namespace="film_search_general")
 async def film_search_general(
     request: Request,
     sort: Optional[str] = "imdb_rating",
     page: dict = Depends(get_page_params),
+    fields: Optional[tuple[str, ...]] = Depends(get_partial_film_fields),
     film_service: FilmService = Depends(get_film_service),
     filter_genre: Optional[UUID] = Query(None, alias="filter[genre]"),
-) -> list[PartialFilmInfo]:
-    out = await film_service.get_by(
-        page_number=page["number"],
-        page_size=page["size"],
+) -> ORJSONResponse:
+    return await paginate(
+        film_service,
+        page,
+        PartialFilmInfo,
+        result_class=BaseFilm,
         sort=sort,
         genre_id=filter_genre,
+        fields=fields,
+    )
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def film_export(
+    request: Request,
+    export_format: str = Depends(get_export_format),
+    fields: Optional[tuple[str, ...]] = Depends(get_film_fields),
+    film_service: FilmService = Depends(get_film_service),
+) -> StreamingResponse:
+    return export(
+        request,
+        film_service,
+        FilmFullInfo,
+        export_format,
+        result_class=Film,
+        fields=fields,
+    )
+
+
+@router.get("/batch", response_model=list[Optional[FilmFullInfo]])
+async def film_batch(
+    request: Request,
+    ids: list[UUID] = Depends(get_batch_ids),
+    film_service: FilmService = Depends(get_film_service),
+    redis: Redis = Depends(get_redis),
+) -> list[Optional[FilmFullInfo]]:
+    return await get_batch(
+        request, redis, film_service, ids, FilmFullInfo, namespace="films"
     )
-    return [PartialFilmInfo(**film.dict()) for film in out]
 
 
 @router.get("/{film_id}", response_model=FilmFullInfo)
-@cache(expire=REDIS_CACHE_EXPIRE)
+@cache(expire=REDIS_CACHE_EXPIRE, namespace="film_details")
 async def film_details(
     request: Request,
     film_id: UUID,
     film_service: FilmService = Depends(get_film_service),
-) -> FilmFullInfo:
-    film = await film_service.get_by_id(film_id)
+    fields: Optional[tuple[str, ...]] = Depends(get_film_fields),
+) -> ORJSONResponse:
+    film = await film_service.get_by_id(film_id, parse=False, fields=fields)
     if not film:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=FILM_NOT_FOUND)
-    return FilmFullInfo(**film.dict())
+    return ORJSONResponse(projection(FilmFullInfo, Film, fields)(film))
@@ -1,57 +1,111 @@
 from http import HTTPStatus
+from typing import Optional, Union
 from uuid import UUID
 
+from aioredis import Redis
 from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi_cache.decorator import cache
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
-from api.v1 import GenrePartial, PartialFilmInfo, get_page_params
+from api.v1 import (
+    CursorPage,
+    GenrePartial,
+    PartialFilmInfo,
+    get_genre_fields,
+    get_page_params,
+    get_partial_film_fields,
+    paginate,
+)
+from api.v1.batch import get_batch, get_batch_ids
+from api.v1.cache import cache, swr_cache
+from api.v1.export import export, get_export_format
 from api.v1.messages import GENRE_NOT_FOUND
+from api.v1.projection import projection
 from core.config import REDIS_CACHE_EXPIRE
+from db.redis import get_redis
+from models.film import BaseFilm
+from models.genre import Genre
 from services.films import FilmService, get_film_service
 from services.genres import GenreService, get_genre_service
 
 router = APIRouter()
 
 
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def genre_export(
+    request: Request,
+    export_format: str = Depends(get_export_format),
+    fields: Optional[tuple[str, ...]] = Depends(get_genre_fields),
+    genre_service: GenreService = Depends(get_genre_service),
+) -> StreamingResponse:
+    return export(
+        request,
+        genre_service,
+        GenrePartial,
+        export_format,
+        result_class=Genre,
+        fields=fields,
+    )
+
+
+@router.get("/batch", response_model=list[Optional[GenrePartial]])
+async def genre_batch(
+    request: Request,
+    ids: list[UUID] = Depends(get_batch_ids),
+    genre_service: GenreService = Depends(get_genre_service),
+    redis: Redis = Depends(get_redis),
+) -> list[Optional[GenrePartial]]:
+    return await get_batch(
+        request, redis, genre_service, ids, GenrePartial, namespace="genres"
+    )
+
+
 @router.get("/{genre_id}", response_model=GenrePartial)
-@cache(expire=REDIS_CACHE_EXPIRE)
+@cache(expire=REDIS_CACHE_EXPIRE, namespace="genre_details")
 async def genre_details(
     request: Request,
     genre_id: UUID,
     genre_service: GenreService = Depends(get_genre_service),
-) -> GenrePartial:
-    genre = await genre_service.get_by_id(genre_id)
+    fields: Optional[tuple[str, ...]] = Depends(get_genre_fields),
+) -> ORJSONResponse:
+    genre = await genre_service.get_by_id(genre_id, parse=False, fields=fields)
     if not genre:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=GENRE_NOT_FOUND)
-    return GenrePartial(**genre.dict())
+    return ORJSONResponse(projection(GenrePartial, Genre, fields)(genre))
 
 
-@router.get("", response_model=list[GenrePartial])
-@cache(expire=REDIS_CACHE_EXPIRE)
+@router.get("", response_model=Union[list[GenrePartial], CursorPage[GenrePartial]])
+@swr_cache(namespace="genres")
 async def genres(
     request: Request,
     page: dict = Depends(get_page_params),
+    fields: Optional[tuple[str, ...]] = Depends(get_genre_fields),
     genre_service: GenreService = Depends(get_genre_service),
-) -> list[GenrePartial]:
-    genres = await genre_service.get_by(
-        page_number=page["number"],
-        page_size=page["size"],
-    )
-    return [GenrePartial(**genre.dict()) for genre in genres]
+) -> ORJSONResponse:
+    return await paginate(genre_service, page, GenrePartial, fields=fields)
 
 
-@router.get("/{genre_id}/films", response_model=list[PartialFilmInfo])
-@cache(expire=REDIS_CACHE_EXPIRE)
+@router.get(
+    "/{genre_id}/films",
+    response_model=Union[list[PartialFilmInfo], CursorPage[PartialFilmInfo]],
+)
+@swr_cache(namespace="genre_films")
 async def genre_films(
     request: Request,
-    genre_id: str,
+    genre_id: UUID,
     page: dict = Depends(get_page_params),
+    fields: Optional[tuple[str, ...]] = Depends(get_partial_film_fields),
     film_service: FilmService = Depends(get_film_service),
-) -> list[PartialFilmInfo]:
-    films = await film_service.get_by(
+) -> ORJSONResponse:
+    return await paginate(
+        film_service,
+        page,
+        PartialFilmInfo,
+        result_class=BaseFilm,
         genre_id=genre_id,
-        page_number=page["number"],
-        page_size=page["size"],
         sort="-imdb_rating",
+        fields=fields,
     )
-    return [PartialFilmInfo(**film.dict()) for film in films]
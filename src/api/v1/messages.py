@@ -1,3 +1,7 @@
 FILM_NOT_FOUND = "film not found"
 GENRE_NOT_FOUND = "genre not found"
 PERSON_NOT_FOUND = "person not found"
+INVALID_CURSOR = "invalid page[after] cursor"
+INVALID_IDS = "ids must be a comma separated list of uuids"
+TOO_MANY_IDS = "too many ids requested"
+UNKNOWN_FIELDS = "unknown fields: {fields}"
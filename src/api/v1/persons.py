@@ -1,73 +1,143 @@
 from http import HTTPStatus
+from typing import Optional, Union
 from uuid import UUID
 
+from aioredis import Redis
 from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi_cache.decorator import cache
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
-from api.v1 import PartialFilmInfo, PersonPartial, get_page_params
+from api.v1 import (
+    CursorPage,
+    PartialFilmInfo,
+    PersonPartial,
+    get_page_params,
+    get_partial_film_fields,
+    get_person_fields,
+    get_required_search_query,
+    paginate,
+)
+from api.v1.batch import get_batch, get_batch_ids
+from api.v1.cache import cache, swr_cache
+from api.v1.export import export, get_export_format
 from api.v1.messages import PERSON_NOT_FOUND
+from api.v1.projection import projection
 from core.config import REDIS_CACHE_EXPIRE
+from db.redis import get_redis
+from models.film import BaseFilm
+from models.person import BasePerson
 from services.films import FilmService, get_film_service
 from services.persons import PersonService, get_person_service
 
 router = APIRouter()
 
 
-@router.get("/search", response_model=list[PersonPartial])
-@cache(expire=REDIS_CACHE_EXPIRE)
+@router.get(
+    "/search", response_model=Union[list[PersonPartial], CursorPage[PersonPartial]]
+)
+@cache(expire=REDIS_CACHE_EXPIRE, namespace="persons_search")
 async def persons_search(
     request: Request,
-    query: str,
+    query: str = Depends(get_required_search_query),
     page: dict = Depends(get_page_params),
+    fields: Optional[tuple[str, ...]] = Depends(get_person_fields),
     person_service: PersonService = Depends(get_person_service),
-) -> list[PersonPartial]:
-    persons = await person_service.get_by(
+) -> ORJSONResponse:
+    return await paginate(
+        person_service,
+        page,
+        PersonPartial,
+        result_class=BasePerson,
         name_part=query,
-        page_number=page["number"],
-        page_size=page["size"],
+        fields=fields,
+    )
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def person_export(
+    request: Request,
+    export_format: str = Depends(get_export_format),
+    fields: Optional[tuple[str, ...]] = Depends(get_person_fields),
+    person_service: PersonService = Depends(get_person_service),
+) -> StreamingResponse:
+    return export(
+        request,
+        person_service,
+        PersonPartial,
+        export_format,
+        result_class=BasePerson,
+        fields=fields,
+    )
+
+
+@router.get("/batch", response_model=list[Optional[PersonPartial]])
+async def person_batch(
+    request: Request,
+    ids: list[UUID] = Depends(get_batch_ids),
+    person_service: PersonService = Depends(get_person_service),
+    redis: Redis = Depends(get_redis),
+) -> list[Optional[PersonPartial]]:
+    return await get_batch(
+        request,
+        redis,
+        person_service,
+        ids,
+        PersonPartial,
+        namespace="persons",
+        result_class=BasePerson,
     )
-    return [PersonPartial(**person.dict()) for person in persons]
 
 
 @router.get("/{person_id}", response_model=PersonPartial)
-@cache(expire=REDIS_CACHE_EXPIRE)
+@cache(expire=REDIS_CACHE_EXPIRE, namespace="person_details")
 async def person_details(
     request: Request,
     person_id: UUID,
     person_service: PersonService = Depends(get_person_service),
-) -> PersonPartial:
-    person = await person_service.get_by_id(person_id)
+    fields: Optional[tuple[str, ...]] = Depends(get_person_fields),
+) -> ORJSONResponse:
+    person = await person_service.get_by_id(
+        person_id, result_class=BasePerson, parse=False, fields=fields
+    )
     if not person:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=PERSON_NOT_FOUND)
-    return PersonPartial(**person.dict())
+    return ORJSONResponse(projection(PersonPartial, BasePerson, fields)(person))
 
 
-@router.get("", response_model=list[PersonPartial])
-@cache(expire=REDIS_CACHE_EXPIRE)
+@router.get("", response_model=Union[list[PersonPartial], CursorPage[PersonPartial]])
+@swr_cache(namespace="persons")
 async def persons(
     request: Request,
     page: dict = Depends(get_page_params),
+    fields: Optional[tuple[str, ...]] = Depends(get_person_fields),
     person_service: PersonService = Depends(get_person_service),
-) -> list[PersonPartial]:
-    persons = await person_service.get_by(
-        page_number=page["number"],
-        page_size=page["size"],
+) -> ORJSONResponse:
+    return await paginate(
+        person_service, page, PersonPartial, result_class=BasePerson, fields=fields
     )
-    return [PersonPartial(**person.dict()) for person in persons]
 
 
-@router.get("/{person_id}/films", response_model=list[PartialFilmInfo])
-@cache(expire=REDIS_CACHE_EXPIRE)
+@router.get(
+    "/{person_id}/films",
+    response_model=Union[list[PartialFilmInfo], CursorPage[PartialFilmInfo]],
+)
+@swr_cache(namespace="person_films")
 async def person_films(
     request: Request,
-    person_id: str,
+    person_id: UUID,
     page: dict = Depends(get_page_params),
+    fields: Optional[tuple[str, ...]] = Depends(get_partial_film_fields),
     film_service: FilmService = Depends(get_film_service),
-) -> list[PartialFilmInfo]:
-    films = await film_service.get_by(
+) -> ORJSONResponse:
+    return await paginate(
+        film_service,
+        page,
+        PartialFilmInfo,
+        result_class=BaseFilm,
         person_id=person_id,
-        page_number=page["number"],
-        page_size=page["size"],
         sort="-imdb_rating",
+        fields=fields,
     )
-    return [PartialFilmInfo(**film.dict()) for film in films]
@@ -0,0 +1,48 @@
+from functools import lru_cache
+from typing import Callable, Optional, Type
+
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_SINGLETON
+
+
+@lru_cache()
+def projection(
+    model: Type[BaseModel],
+    source_model: Type[BaseModel],
+    fields: Optional[tuple[str, ...]] = None,
+) -> Callable[[dict], dict]:
+    """
+    Function building json representation of `model` right from `_source`
+    of a `source_model` document, without validation. Field mapping is
+    resolved once through aliases: alias of a `model` field is both the
+    output key (responses are serialized by alias) and the name of the
+    `source_model` field, alias of which is the `_source` key,
+    e.g. uuid <- id, full_name <- name.
+    Only `fields` (output keys) are built if they are given.
+    """
+    mapping = []
+    for field in model.__fields__.values():
+        if fields is not None and field.alias not in fields:
+            continue
+        source_field = source_model.__fields__[field.alias]
+        nested = None
+        if isinstance(field.type_, type) and issubclass(field.type_, BaseModel):
+            nested = projection(field.type_, source_field.type_)
+        mapping.append(
+            (field.alias, source_field.alias, nested, field.shape != SHAPE_SINGLETON)
+        )
+
+    def project(source: dict) -> dict:
+        result = {}
+        for name, key, nested, many in mapping:
+            value = source.get(key)
+            if many:
+                value = value or []
+                if nested is not None:
+                    value = [nested(item) for item in value]
+            elif nested is not None and value is not None:
+                value = nested(value)
+            result[name] = value
+        return result
+
+    return project
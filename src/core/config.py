@@ -1,3 +1,4 @@
+import json
 import os
 from logging import config as logging_config
 
@@ -20,4 +21,92 @@ UVICORN_RELOAD = bool(os.getenv("UVICORN_RELOAD", False))
 IS_DEBUG = bool(os.getenv("DEBUG", 0))
 
 MAX_ES_SEARCH_FROM_SIZE = 5 if IS_DEBUG else 10_000
-REDIS_CACHE_EXPIRE = 60
+# largest page[size] accepted by list endpoints
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 1000))
+# cache keys embed index data versions, so entries may live long
+REDIS_CACHE_EXPIRE = int(os.getenv("REDIS_CACHE_EXPIRE", 3 * 3600))
+# how long clients and proxies may reuse a response without revalidating it
+# by etag, kept short so data updates show up within seconds
+CLIENT_CACHE_MAX_AGE = int(os.getenv("CLIENT_CACHE_MAX_AGE", 5))
+
+# search_after checkpoints of deep pages, seconds / entries in local fallback
+PAGINATION_CHECKPOINT_EXPIRE = int(os.getenv("PAGINATION_CHECKPOINT_EXPIRE", 3600))
+PAGINATION_CHECKPOINT_LOCAL_SIZE = 1024
+# how long index version taken from index stats is trusted, seconds
+INDEX_VERSION_TTL = float(os.getenv("INDEX_VERSION_TTL", 5))
+# key used to sign opaque page[after] cursors, must be shared by all workers;
+# required outside debug, the app refuses to start without it
+CURSOR_SECRET = os.getenv("CURSOR_SECRET") or ("debug" if IS_DEBUG else None)
+# shared point in time per index, reopened after ES_PIT_REFRESH_AFTER seconds
+ES_PIT_KEEP_ALIVE = os.getenv("ES_PIT_KEEP_ALIVE", "1m")
+ES_PIT_REFRESH_AFTER = float(os.getenv("ES_PIT_REFRESH_AFTER", 30))
+# coalescing of identical in-flight ES queries, optionally across workers
+SINGLE_FLIGHT_REDIS = bool(int(os.getenv("SINGLE_FLIGHT_REDIS", 0)))
+SINGLE_FLIGHT_LOCK_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_LOCK_TIMEOUT", 5))
+SINGLE_FLIGHT_RESULT_EXPIRE = float(os.getenv("SINGLE_FLIGHT_RESULT_EXPIRE", 2))
+SINGLE_FLIGHT_POLL_INTERVAL = 0.02
+# get_by_id calls arriving within the window are sent to ES as one mget
+ES_MGET_WINDOW_US = int(os.getenv("ES_MGET_WINDOW_US", 500))
+ES_MGET_MAX_BATCH = int(os.getenv("ES_MGET_MAX_BATCH", 100))
+# max ids in one /batch request
+BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", 100))
+# in-process cache layer over redis, memory budgets per cache namespace (route)
+LOCAL_CACHE_TTL = float(os.getenv("LOCAL_CACHE_TTL", 60))
+LOCAL_CACHE_DEFAULT_BUDGET = int(os.getenv("LOCAL_CACHE_DEFAULT_BUDGET", 4 * 2**20))
+LOCAL_CACHE_BUDGETS = {
+    "film_details": 32 * 2**20,
+    "film_search_general": 16 * 2**20,
+    "genre_details": 2**20,
+    "genres": 2**20,
+    "genre_films": 16 * 2**20,
+    "person_details": 8 * 2**20,
+    **json.loads(os.getenv("LOCAL_CACHE_BUDGETS", "{}")),
+}
+LOCAL_CACHE_INVALIDATION_CHANNEL = "fastapi-cache:invalidate"
+# stale-while-revalidate: fresh until soft ttl, served stale and refreshed
+# in background until hard ttl
+CACHE_SOFT_TTL = int(os.getenv("CACHE_SOFT_TTL", REDIS_CACHE_EXPIRE))
+CACHE_HARD_TTL = int(os.getenv("CACHE_HARD_TTL", 10 * REDIS_CACHE_EXPIRE))
+CACHE_REFRESH_LOCK_TIMEOUT = 30
+# cached response bodies larger than this are stored gzipped
+CACHE_COMPRESS_MIN_SIZE = int(os.getenv("CACHE_COMPRESS_MIN_SIZE", 1024))
+CACHE_COMPRESS_LEVEL = 5
+# how often index data versions are polled from ES stats and redis, seconds
+INDEX_VERSION_POLL_INTERVAL = float(os.getenv("INDEX_VERSION_POLL_INTERVAL", 5))
+# documents cached by (index, data version, id), shared by list and detail pages
+# without it searches fetch only the fields of responses from ES `_source`
+ENTITY_CACHE_ENABLED = bool(int(os.getenv("ENTITY_CACHE_ENABLED", 1)))
+ENTITY_CACHE_EXPIRE = int(os.getenv("ENTITY_CACHE_EXPIRE", REDIS_CACHE_EXPIRE))
+# cache warmer, renders popular pages at startup and every interval seconds
+CACHE_WARMER_ENABLED = bool(int(os.getenv("CACHE_WARMER_ENABLED", 1)))
+CACHE_WARMER_INTERVAL = float(os.getenv("CACHE_WARMER_INTERVAL", 600))
+CACHE_WARMER_CONCURRENCY = int(os.getenv("CACHE_WARMER_CONCURRENCY", 4))
+CACHE_WARMER_FILM_PAGES = int(os.getenv("CACHE_WARMER_FILM_PAGES", 5))
+CACHE_WARMER_FILM_SORTS = os.getenv(
+    "CACHE_WARMER_FILM_SORTS", "-imdb_rating,imdb_rating"
+).split(",")
+# films and persons details, and most requested paths to warm
+CACHE_WARMER_TOP_K = int(os.getenv("CACHE_WARMER_TOP_K", 100))
+# extra paths with query, e.g. ["/api/v1/films/search?query=star"]
+CACHE_WARMER_PATHS = json.loads(os.getenv("CACHE_WARMER_PATHS", "[]"))
+# ids which were not found are remembered for a short time, seconds
+NOT_FOUND_CACHE_EXPIRE = int(os.getenv("NOT_FOUND_CACHE_EXPIRE", 30))
+# bloom filters of all ids of indices, rebuilt after data changes
+BLOOM_FILTER_ENABLED = bool(int(os.getenv("BLOOM_FILTER_ENABLED", 0)))
+BLOOM_FILTER_ERROR_RATE = float(os.getenv("BLOOM_FILTER_ERROR_RATE", 0.01))
+BLOOM_FILTER_REBUILD_INTERVAL = float(os.getenv("BLOOM_FILTER_REBUILD_INTERVAL", 60))
+BLOOM_FILTER_LOCK_TIMEOUT = 300
+# share of storage documents validated by pydantic, the rest are trusted
+MODEL_VALIDATION_SAMPLE_RATE = float(
+    os.getenv("MODEL_VALIDATION_SAMPLE_RATE", 1 if IS_DEBUG else 0)
+)
+# documents read from ES per step of catalog export and its own pit keep alive
+ES_EXPORT_BATCH_SIZE = int(os.getenv("ES_EXPORT_BATCH_SIZE", 1000))
+ES_EXPORT_PIT_KEEP_ALIVE = os.getenv("ES_EXPORT_PIT_KEEP_ALIVE", "5m")
+# compiled query templates kept per service, one per (filters, sort) shape
+QUERY_TEMPLATES_CACHE_SIZE = int(os.getenv("QUERY_TEMPLATES_CACHE_SIZE", 256))
+# film ids ranked by rating in redis sorted sets, overall and per genre,
+# updated after movies data changes
+FILM_RANKINGS_ENABLED = bool(int(os.getenv("FILM_RANKINGS_ENABLED", 1)))
+FILM_RANKINGS_REFRESH_INTERVAL = float(os.getenv("FILM_RANKINGS_REFRESH_INTERVAL", 5))
+FILM_RANKINGS_LOCK_TIMEOUT = 300
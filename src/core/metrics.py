@@ -0,0 +1,27 @@
+from collections import defaultdict
+
+
+class Metrics:
+    """In-process counters and value summaries, one set per worker"""
+
+    def __init__(self):
+        self.counters: defaultdict[str, float] = defaultdict(float)
+        self.summaries: dict[str, dict[str, float]] = {}
+
+    def inc(self, name: str, value: float = 1) -> None:
+        self.counters[name] += value
+
+    def observe(self, name: str, value: float) -> None:
+        summary = self.summaries.setdefault(
+            name, {"count": 0, "sum": 0, "max": value, "min": value}
+        )
+        summary["count"] += 1
+        summary["sum"] += value
+        summary["max"] = max(summary["max"], value)
+        summary["min"] = min(summary["min"], value)
+
+    def snapshot(self) -> dict:
+        return {"counters": dict(self.counters), "summaries": dict(self.summaries)}
+
+
+metrics = Metrics()
@@ -0,0 +1,241 @@
+import asyncio
+import logging
+from collections import Counter
+from http import HTTPStatus
+from itertools import islice
+from operator import itemgetter
+from typing import Callable, Iterable, Optional
+from urllib.parse import urlencode
+
+import orjson
+from aioredis import Redis
+from aioredis.exceptions import RedisError
+
+from core.config import (
+    CACHE_WARMER_CONCURRENCY,
+    CACHE_WARMER_FILM_PAGES,
+    CACHE_WARMER_FILM_SORTS,
+    CACHE_WARMER_INTERVAL,
+    CACHE_WARMER_PATHS,
+    CACHE_WARMER_TOP_K,
+)
+from core.metrics import metrics
+from db.locks import RedisLock
+
+logger = logging.getLogger(__name__)
+
+WARMER_HEADER = "X-Cache-Warmer"
+
+
+class AccessLog:
+    """
+    Counts successful requests to cached endpoints in process memory.
+    At most `keep` paths are counted between flushes: a new path replaces
+    the least counted one and takes over its count (space saving), so
+    heavy hitters survive while random paths can not grow the log.
+    Counts are periodically flushed into a redis sorted set shared by all
+    workers, the warmer takes the most requested paths from it.
+    """
+
+    key = "cache-warmer:hits"
+
+    def __init__(self, keep: int = 10 * CACHE_WARMER_TOP_K):
+        self.keep = keep
+        self._hits: Counter[str] = Counter()
+
+    def record(self, path: str, query: str = "") -> None:
+        path = "{p}?{q}".format(p=path, q=query) if query else path
+        hits = self._hits
+        if path in hits or len(hits) < self.keep:
+            hits[path] += 1
+            return
+        evicted, count = min(hits.items(), key=itemgetter(1))
+        del hits[evicted]
+        hits[path] = count + 1
+
+    async def flush(self, redis: Redis) -> None:
+        hits, self._hits = self._hits, Counter()
+        if not hits:
+            return
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                for path, count in hits.items():
+                    pipe.zincrby(self.key, count, path)
+                # drop the long tail, so the set doesn't grow unbounded
+                pipe.zremrangebyrank(self.key, 0, -self.keep - 1)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning("access log flush failed: %s", e)
+
+    async def top(self, redis: Redis, count: int) -> list[str]:
+        try:
+            paths = await redis.zrevrange(self.key, 0, count - 1)
+        except RedisError as e:
+            logger.warning("access log read failed: %s", e)
+            return []
+        return [p.decode() for p in paths]
+
+
+access_log = AccessLog()
+
+
+class CacheWarmer:
+    """
+    Renders popular pages through the app itself, so responses get into
+    the cache before live traffic asks for them: first pages of /films,
+    genres with first pages of their films, details of top rated films and
+    of their persons, paths from CACHE_WARMER_PATHS and most requested
+    paths from `access_log`. Runs at startup and every `interval` seconds
+    in one worker at a time, at most `concurrency` requests at once.
+    """
+
+    lock_key = "cache-warmer:lock"
+
+    def __init__(
+        self,
+        app: Callable,
+        redis: Redis,
+        interval: float = CACHE_WARMER_INTERVAL,
+        concurrency: int = CACHE_WARMER_CONCURRENCY,
+        film_pages: int = CACHE_WARMER_FILM_PAGES,
+        film_sorts: Iterable[str] = CACHE_WARMER_FILM_SORTS,
+        top_k: int = CACHE_WARMER_TOP_K,
+        paths: Iterable[str] = CACHE_WARMER_PATHS,
+        log: AccessLog = access_log,
+    ):
+        self.app = app
+        self.redis = redis
+        self.interval = interval
+        self.film_pages = film_pages
+        self.film_sorts = list(film_sorts)
+        self.top_k = top_k
+        self.paths = list(paths)
+        self.log = log
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def warm(self) -> None:
+        try:
+            # not released: the lock also keeps other workers from warming
+            # again within the interval
+            locked = await RedisLock(
+                self.redis, self.lock_key, max(self.interval, 1)
+            ).acquire()
+        except RedisError as e:
+            logger.warning("cache warmer lock failed: %s", e)
+            return
+        if not locked:
+            # warmed by another worker
+            return
+        metrics.inc("cache.warmer.runs")
+
+        films_pages = await self._get_all(
+            _url("/api/v1/films", {"sort": sort, "page[number]": number})
+            for sort in self.film_sorts
+            for number in range(1, self.film_pages + 1)
+        )
+        film_ids = _unique(
+            film["uuid"] for page in films_pages if page for film in page
+        )
+        genres = await self._get("/api/v1/genres") or []
+        films = await self._get_all(
+            "/api/v1/films/{id}".format(id=film_id)
+            for film_id in islice(film_ids, self.top_k)
+        )
+        person_ids = _unique(
+            person["uuid"]
+            for film in films
+            if film
+            for role in ("actors", "writers", "directors")
+            for person in film[role]
+        )
+        await self._get_all(
+            [
+                *(
+                    "/api/v1/genres/{id}/films".format(id=genre["uuid"])
+                    for genre in genres
+                ),
+                *(
+                    "/api/v1/persons/{id}".format(id=person_id)
+                    for person_id in islice(person_ids, self.top_k)
+                ),
+                *self.paths,
+                *await self.log.top(self.redis, self.top_k),
+            ]
+        )
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.log.flush(self.redis)
+                await self.warm()
+            except Exception:
+                logger.exception("cache warming failed")
+            await asyncio.sleep(self.interval)
+
+    async def _get_all(self, urls: Iterable[str]) -> list:
+        return await asyncio.gather(*(self._get(url) for url in urls))
+
+    async def _get(self, url: str):
+        """Renders url with the app, returns decoded json body or None"""
+        path, _, query = url.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "server": ("cache-warmer", 80),
+            "client": ("127.0.0.1", 0),
+            "root_path": "",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "headers": [
+                (b"host", b"cache-warmer"),
+                (WARMER_HEADER.lower().encode(), b"1"),
+            ],
+        }
+        status, chunks = None, []
+
+        async def receive() -> dict:
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        async with self._semaphore:
+            try:
+                await self.app(scope, receive, send)
+            except Exception:
+                logger.exception("cache warming of %s failed", url)
+                status = None
+        if status != HTTPStatus.OK:
+            metrics.inc("cache.warmer.errors")
+            logger.debug("cache warming of %s returned %s", url, status)
+            return None
+        metrics.inc("cache.warmer.requests")
+        return orjson.loads(b"".join(chunks))
+
+
+def _url(path: str, params: dict) -> str:
+    return "{p}?{q}".format(p=path, q=urlencode(params))
+
+
+def _unique(values: Iterable[str]) -> Iterable[str]:
+    return iter(dict.fromkeys(values))
+
+
+warmer: Optional[CacheWarmer] = None
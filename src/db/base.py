@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import AsyncIterator, Optional
 
 from pydantic import BaseModel, Field
 
@@ -6,29 +7,48 @@ from pydantic import BaseModel, Field
 class QueryOptions(BaseModel):
     must: list
     should: list
+    # filter context: not scored, cached by ES as bitsets
+    filter: list = []
+    must_not: list = []
+
+    @property
+    def scored(self) -> bool:
+        return bool(self.must or self.should)
 
 
 class QueryParam(BaseModel):
     bool_: QueryOptions = Field(QueryOptions(must=[], should=[]), alias="bool")
 
 
-class SortFieldOption(BaseModel):
-    order: str = "desc"
-
+class BaseStorage(ABC):
+    @abstractmethod
+    async def get_by_id(
+        self, index: str, id, source_includes: Optional[list[str]] = None
+    ) -> dict:
+        pass
 
-class SortParam(BaseModel):
-    fields: list[dict[str, SortFieldOption]]
+    @abstractmethod
+    async def get_by_ids(
+        self, index: str, ids: list, source_includes: Optional[list[str]] = None
+    ) -> list[Optional[dict]]:
+        pass
 
+    @abstractmethod
+    async def get_with_search(self, query: dict, sort: list, **kwargs) -> dict:
+        pass
 
-class BaseStorage(ABC):
     @abstractmethod
-    async def get_by_id(self, index: str, id) -> dict:
+    def iter_sources(
+        self,
+        index: str,
+        sort: list,
+        source_includes: Optional[list[str]] = None,
+        **kwargs,
+    ) -> AsyncIterator[list[dict]]:
         pass
 
     @abstractmethod
-    async def get_with_search(
-        self, query: QueryParam, sort: SortParam, freeze_idx: dict, **kwargs
-    ) -> dict:
+    async def has_field(self, index: str, field: str) -> bool:
         pass
 
     @abstractmethod
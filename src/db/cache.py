@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from time import monotonic
+from typing import Optional, Tuple
+from uuid import uuid4
+
+from aioredis import Redis
+from aioredis.exceptions import RedisError
+from fastapi_cache.backends import Backend
+from fastapi_cache.backends.redis import RedisBackend
+
+from core.config import (
+    LOCAL_CACHE_BUDGETS,
+    LOCAL_CACHE_DEFAULT_BUDGET,
+    LOCAL_CACHE_INVALIDATION_CHANNEL,
+    LOCAL_CACHE_TTL,
+)
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LocalLRU:
+    """LRU of values with expiration time, bounded by total size in bytes"""
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.size = 0
+        self._data: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[tuple[float, bytes]]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[0] <= monotonic():
+            self.pop(key)
+            return None
+        self._data.move_to_end(key)
+        return item
+
+    def set(self, key: str, value: bytes, expires_at: float) -> None:
+        self.pop(key)
+        if len(value) > self.budget:
+            return
+        self._data[key] = (expires_at, value)
+        self.size += len(value)
+        while self.size > self.budget:
+            _, (_, evicted) = self._data.popitem(last=False)
+            self.size -= len(evicted)
+            metrics.inc("cache.local.evictions")
+
+    def pop(self, key: str) -> None:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.size -= len(item[1])
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.size = 0
+
+
+class TwoTierBackend(Backend):
+    """
+    fastapi_cache backend keeping hot entries in process memory in front of
+    redis. Every namespace has its own LRU with LOCAL_CACHE_BUDGETS bytes.
+    Writes and clears are announced over redis pub/sub so other workers drop
+    their local copies.
+    """
+
+    def __init__(self, redis: Redis, local_ttl: float = LOCAL_CACHE_TTL):
+        self.redis = redis
+        self.remote = RedisBackend(redis)
+        self.local_ttl = local_ttl
+        self.worker_id = "{p}-{u}".format(p=os.getpid(), u=uuid4().hex[:8])
+        self._lrus: dict[str, LocalLRU] = {}
+        self._listener: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def namespace(key: str) -> str:
+        # keys are built as "{prefix}:{namespace}:{hash}"
+        parts = key.split(":")
+        return parts[1] if len(parts) > 2 else ""
+
+    def _lru(self, key: str) -> LocalLRU:
+        namespace = self.namespace(key)
+        lru = self._lrus.get(namespace)
+        if lru is None:
+            budget = LOCAL_CACHE_BUDGETS.get(namespace, LOCAL_CACHE_DEFAULT_BUDGET)
+            lru = self._lrus[namespace] = LocalLRU(budget)
+        return lru
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        item = self._lru(key).get(key)
+        if item is not None:
+            metrics.inc("cache.local.hits")
+            return int(item[0] - monotonic()), item[1]
+        metrics.inc("cache.local.misses")
+        ttl, value = await self.remote.get_with_ttl(key)
+        if value is not None:
+            self._store_local(key, value, ttl)
+        return ttl, value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return (await self.get_with_ttl(key))[1]
+
+    async def set(self, key: str, value, expire: int = None):
+        await self.remote.set(key, value, expire=expire)
+        self._store_local(key, value, expire)
+        await self._announce(key)
+
+    async def clear(self, namespace: str = None, key: str = None) -> int:
+        if namespace:
+            self._drop_namespace(namespace)
+            await self._announce("ns:" + namespace)
+        elif key:
+            self._lru(key).pop(key)
+            await self._announce(key)
+        return await self.remote.clear(namespace, key)
+
+    def _store_local(self, key: str, value, ttl: Optional[int]) -> None:
+        if isinstance(value, str):
+            value = value.encode()
+        local_ttl = (
+            self.local_ttl if ttl is None or ttl < 0 else min(ttl, self.local_ttl)
+        )
+        if local_ttl > 0:
+            self._lru(key).set(key, value, monotonic() + local_ttl)
+
+    def _drop_namespace(self, namespace: str) -> None:
+        # namespace given to clear is prefixed: "{prefix}:{namespace}"
+        for lru_namespace, lru in self._lrus.items():
+            if namespace.endswith(":" + lru_namespace) or namespace == lru_namespace:
+                lru.clear()
+
+    async def _announce(self, target: str) -> None:
+        try:
+            await self.redis.publish(
+                LOCAL_CACHE_INVALIDATION_CHANNEL,
+                "{w} {t}".format(w=self.worker_id, t=target),
+            )
+        except RedisError as e:
+            logger.warning("cache invalidation publish failed: %s", e)
+
+    def _on_invalidation(self, message: str) -> None:
+        sender, target = message.split(" ", 1)
+        if sender == self.worker_id:
+            return
+        metrics.inc("cache.local.invalidations")
+        if target.startswith("ns:"):
+            self._drop_namespace(target.removeprefix("ns:"))
+        else:
+            self._lru(target).pop(target)
+
+    async def start(self) -> None:
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(LOCAL_CACHE_INVALIDATION_CHANNEL)
+                    while True:
+                        message = await pubsub.get_message(
+                            ignore_subscribe_messages=True, timeout=1.0
+                        )
+                        if message is not None:
+                            data = message["data"]
+                            if isinstance(data, bytes):
+                                data = data.decode()
+                            self._on_invalidation(data)
+            except RedisError as e:
+                # local entries may be stale while we are not subscribed
+                logger.warning("cache invalidation listener failed: %s", e)
+                for lru in self._lrus.values():
+                    lru.clear()
+                await asyncio.sleep(1)
@@ -0,0 +1,86 @@
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+import orjson
+from aioredis import Redis
+from aioredis.exceptions import RedisError
+
+from core.config import (
+    PAGINATION_CHECKPOINT_EXPIRE,
+    PAGINATION_CHECKPOINT_LOCAL_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointStore:
+    """
+    Keeps `sort` values of the last hit before every
+    MAX_ES_SEARCH_FROM_SIZE boundary, so deep pages resume from
+    the nearest one instead of walking from the first document.
+    Checkpoints live in redis, in-process dict is used when redis is absent
+    or fails.
+    """
+
+    prefix = "pagination-checkpoints"
+
+    def __init__(
+        self,
+        redis: Optional[Redis] = None,
+        expire: int = PAGINATION_CHECKPOINT_EXPIRE,
+        local_size: int = PAGINATION_CHECKPOINT_LOCAL_SIZE,
+    ):
+        self.redis = redis
+        self.expire = expire
+        self.local_size = local_size
+        self._local: OrderedDict[str, dict[int, list]] = OrderedDict()
+
+    async def get(self, key: str) -> dict[int, list]:
+        """Returns all known checkpoints for key as {boundary number: sort}"""
+        if self.redis is not None:
+            try:
+                raw = await self.redis.hgetall(self._redis_key(key))
+            except RedisError as e:
+                logger.warning("checkpoints redis read failed: %s", e)
+            else:
+                return {int(k): orjson.loads(v) for k, v in raw.items()}
+        checkpoints = self._local.get(key, {})
+        if checkpoints:
+            self._local.move_to_end(key)
+        return dict(checkpoints)
+
+    async def nearest(self, key: str, boundary: int) -> tuple[int, Optional[list]]:
+        """Returns the closest checkpoint not further than `boundary`"""
+        checkpoints = await self.get(key)
+        known = [b for b in checkpoints if b <= boundary]
+        if not known:
+            return 0, None
+        best = max(known)
+        return best, checkpoints[best]
+
+    async def save(self, key: str, boundary: int, sort: list) -> None:
+        self._local.setdefault(key, {})[boundary] = sort
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+        if self.redis is None:
+            return
+        redis_key = self._redis_key(key)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hset(redis_key, str(boundary), orjson.dumps(sort))
+                pipe.expire(redis_key, self.expire)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning("checkpoints redis write failed: %s", e)
+
+    def _redis_key(self, key: str) -> str:
+        return "{p}:{k}".format(p=self.prefix, k=key)
+
+
+checkpoints: CheckpointStore = CheckpointStore()
+
+
+async def get_checkpoints() -> CheckpointStore:
+    return checkpoints
@@ -1,54 +1,278 @@
 import logging
-from typing import Optional
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import AsyncIterator, Optional
 
 from elasticsearch import AsyncElasticsearch, exceptions
+from elasticsearch.helpers import async_scan
 
-from db.base import BaseStorage, QueryParam, SortParam
+from core.config import (
+    ES_EXPORT_BATCH_SIZE,
+    ES_EXPORT_PIT_KEEP_ALIVE,
+    ES_PIT_KEEP_ALIVE,
+    INDEX_VERSION_TTL,
+)
+from db.base import BaseStorage
+from db.loader import MGetLoader
+from db.pit import PitPool, PointInTime
+from db.singleflight import SingleFlight
+from db.utils import fingerprint
 
 logger = logging.getLogger(__name__)
 
 
 class ESStorage(BaseStorage):
-    def __init__(self, elastic: AsyncElasticsearch):
+    def __init__(
+        self, elastic: AsyncElasticsearch, singleflight: Optional[SingleFlight] = None
+    ):
         self.es = elastic
+        self.singleflight = singleflight or SingleFlight()
+        self.pits = PitPool(elastic)
+        self._loaders: dict[tuple, MGetLoader] = {}
+        self._versions: dict[str, tuple[float, str]] = {}
+        # (index, field) -> (index version it was checked for, result)
+        self._fields: dict[tuple[str, str], tuple[str, bool]] = {}
 
-    async def get_by_id(self, index: str, id):
+    async def get_by_id(
+        self, index: str, id, source_includes: Optional[list[str]] = None
+    ):
+        key = fingerprint("get", index, str(id), source_includes)
+        return await self.singleflight.do(
+            key, lambda: self._get_by_id(index, id, source_includes)
+        )
+
+    async def _get_by_id(
+        self, index: str, id, source_includes: Optional[list[str]] = None
+    ):
+        loader_key = (index, tuple(source_includes or ()))
+        loader = self._loaders.get(loader_key)
+        if loader is None:
+            loader = MGetLoader(self.es, index=index, source_includes=source_includes)
+            self._loaders[loader_key] = loader
+        return await loader.load(str(id))
+
+    async def get_by_ids(
+        self, index: str, ids: list, source_includes: Optional[list[str]] = None
+    ) -> list[Optional[dict]]:
+        """Documents in order of ids with one mget, None for missing ones"""
+        if not ids:
+            return []
         try:
-            doc = await self.es.get(
+            resp = await self.es.mget(
                 index=index,
-                id=str(id),
+                ids=[str(id) for id in ids],
+                source_includes=source_includes,
             )
         except exceptions.NotFoundError:
-            return None
-        return doc
+            return [None] * len(ids)
+        return [doc if doc.get("found") else None for doc in resp["docs"]]
 
     async def get_with_search(
         self,
-        query: QueryParam,
-        sort: SortParam,
+        query: dict,
+        sort: list,
         search_after=None,
         size: Optional[int] = None,
         from_: Optional[int] = None,
         pit: Optional[str] = None,
+        index: Optional[str] = None,
+        sort_only: bool = False,
+        source_includes: Optional[list[str]] = None,
+        fetch_source: bool = True,
     ):
-        logger.debug("sort params: \n\n {s}\n\n".format(s=sort.dict(by_alias=True)))
-        logger.debug("query params: \n\n {s}\n\n".format(s=query.dict(by_alias=True)))
-        return await self.es.search(
-            query=query.dict(by_alias=True),
-            sort=sort.dict(by_alias=True)["fields"],
-            pit={"id": pit, "keep_alive": "1m"},
+        """
+        Searches within point in time if `pit` is given, else in `index`.
+        With `sort_only` hits carry nothing but `sort` values, which is enough
+        to skip documents with search_after, otherwise `_source` is cut down
+        to `source_includes` fields if they are given. Without `fetch_source`
+        hits have only `_id` and `sort`.
+        Identical concurrent searches share one request to ES.
+        """
+        search_args = dict(
+            search_after=search_after,
+            size=size,
+            from_=from_,
+            pit=pit,
+            index=index,
+            sort_only=sort_only,
+            source_includes=source_includes,
+            fetch_source=fetch_source,
+        )
+        key = fingerprint(
+            "search",
+            query,
+            sort,
+            search_args,
+        )
+        return await self.singleflight.do(
+            key, lambda: self._search(query=query, sort=sort, **search_args)
+        )
+
+    async def _search(
+        self,
+        query: dict,
+        sort: list,
+        search_after=None,
+        size: Optional[int] = None,
+        from_: Optional[int] = None,
+        pit: Optional[str] = None,
+        index: Optional[str] = None,
+        sort_only: bool = False,
+        source_includes: Optional[list[str]] = None,
+        fetch_source: bool = True,
+    ):
+        logger.debug("query params: %s, sort params: %s", query, sort)
+        if pit is not None:
+            target = {"pit": {"id": pit, "keep_alive": ES_PIT_KEEP_ALIVE}}
+        else:
+            target = {"index": index}
+        if sort_only:
+            target.update(
+                source=False,
+                filter_path="pit_id,hits.hits.sort",
+                track_total_hits=False,
+            )
+        elif not fetch_source:
+            target.update(
+                source=False,
+                filter_path="pit_id,hits.hits._id,hits.hits.sort",
+                track_total_hits=False,
+            )
+        elif source_includes is not None:
+            target["source_includes"] = source_includes
+        resp = await self.es.search(
+            query=query,
+            sort=sort,
             size=size,
             from_=from_,
             search_after=search_after,
+            **target,
         )
+        if (sort_only or not fetch_source) and "hits" not in resp:
+            # filter_path drops the whole hits object when nothing is found
+            empty = {"hits": {"hits": []}}
+            if resp.get("pit_id") is not None:
+                empty["pit_id"] = resp["pit_id"]
+            return empty
+        return resp
 
-    async def open_pit(self, index: str, keep_alive="1m"):
+    @asynccontextmanager
+    async def pit(self, index: str) -> AsyncIterator[PointInTime]:
+        """
+        Shared point in time of index, opened at or after its current data
+        version, which it carries. Searches within it should pass the
+        latest `pit_id` back with `update_pit`
+        """
+        # version is taken before the pit is opened, so the snapshot is never
+        # older than the version it is labeled with
+        version = await self.index_version(index)
+        async with self.pits.acquire(index, version) as pit:
+            yield pit
+
+    @staticmethod
+    def update_pit(pit: PointInTime, resp: dict) -> None:
+        pit.id = resp.get("pit_id") or pit.id
+
+    async def open_pit(self, index: str, keep_alive=ES_PIT_KEEP_ALIVE):
         return await self.es.open_point_in_time(index=index, keep_alive=keep_alive)
 
     async def close_pit(self, id: str):
         return await self.es.close_point_in_time(id=id)
 
+    async def index_version(self, index: str) -> str:
+        """
+        Token that changes whenever added, updated or deleted documents of
+        index become searchable or index is recreated. Taken from refresh
+        stats and kept for INDEX_VERSION_TTL seconds. Counters are reset by
+        node restarts, so a token may repeat, see IndexVersionWatcher.
+        """
+        expires_at, version = self._versions.get(index, (0, ""))
+        if expires_at > monotonic():
+            return version
+        stats = await self.es.indices.stats(index=index, metric="docs,refresh")
+        primaries = stats["_all"]["primaries"]
+        refresh = primaries["refresh"]
+        uuids = sorted(idx["uuid"] for idx in stats["indices"].values())
+        version = "{u}:{c}:{r}".format(
+            u=",".join(uuids),
+            c=primaries["docs"]["count"],
+            r=refresh.get("external_total", refresh["total"]),
+        )
+        self._versions[index] = (monotonic() + INDEX_VERSION_TTL, version)
+        return version
+
+    async def has_field(self, index: str, field: str) -> bool:
+        """
+        True if `field` is mapped in every index behind `index`, checked once
+        per index version. Documents may have no values of the field.
+        """
+        version = await self.index_version(index)
+        checked_for, result = self._fields.get((index, field), (None, False))
+        if checked_for == version:
+            return result
+        resp = await self.singleflight.do(
+            fingerprint("has_field", index, field, version),
+            lambda: self.es.indices.get_field_mapping(index=index, fields=field),
+        )
+        result = bool(resp) and all(
+            field in mapping["mappings"] for mapping in resp.values()
+        )
+        self._fields[(index, field)] = (version, result)
+        return result
+
+    async def count(self, index: str) -> int:
+        resp = await self.es.count(index=index)
+        return resp["count"]
+
+    async def scan_ids(self, index: str) -> AsyncIterator[str]:
+        """Ids of all documents of index, read with scroll"""
+        async for hit in async_scan(
+            self.es, index=index, query={"query": {"match_all": {}}, "_source": False}
+        ):
+            yield hit["_id"]
+
+    async def iter_sources(
+        self,
+        index: str,
+        sort: list,
+        source_includes: Optional[list[str]] = None,
+        size: int = ES_EXPORT_BATCH_SIZE,
+        keep_alive: str = ES_EXPORT_PIT_KEEP_ALIVE,
+    ) -> AsyncIterator[list[dict]]:
+        """
+        `_source` of all documents of index by batches of `size`, walked with
+        search_after within a point in time of its own, so the whole walk
+        sees one snapshot. The next batch is requested only when the caller
+        asks for it.
+        """
+        pit = await self.open_pit(index, keep_alive=keep_alive)
+        pit_id = pit["id"]
+        search_after = None
+        try:
+            while True:
+                resp = await self.es.search(
+                    pit={"id": pit_id, "keep_alive": keep_alive},
+                    sort=sort,
+                    size=size,
+                    search_after=search_after,
+                    source_includes=source_includes,
+                    track_total_hits=False,
+                )
+                pit_id = resp.get("pit_id", pit_id)
+                hits = resp["hits"]["hits"]
+                if hits:
+                    yield [hit["_source"] for hit in hits]
+                if len(hits) < size:
+                    return
+                search_after = hits[-1]["sort"]
+        finally:
+            try:
+                await self.close_pit(pit_id)
+            except (exceptions.ApiError, exceptions.TransportError) as e:
+                logger.warning("failed to close export pit: %s", e)
+
     async def close(self):
+        await self.pits.close()
         return await self.es.close()
 
 
@@ -0,0 +1,68 @@
+import logging
+from typing import Optional
+
+import orjson
+from aioredis import Redis
+from aioredis.exceptions import RedisError
+
+from core.config import ENTITY_CACHE_EXPIRE
+from core.metrics import metrics
+from db.versions import IndexVersions, index_versions
+
+logger = logging.getLogger(__name__)
+
+
+class EntityCache:
+    """
+    `_source` of documents in redis keyed by index, index data version and
+    id, so any data change of index moves readers to fresh entries.
+    """
+
+    prefix = "entity"
+
+    def __init__(
+        self,
+        redis: Redis,
+        expire: int = ENTITY_CACHE_EXPIRE,
+        versions: IndexVersions = index_versions,
+    ):
+        self.redis = redis
+        self.expire = expire
+        self.versions = versions
+
+    def _key(self, index: str, id: str) -> str:
+        return "{p}:{i}:{v}:{id}".format(
+            p=self.prefix, i=index, v=self.versions.get(index), id=id
+        )
+
+    async def get_many(self, index: str, ids: list[str]) -> list[Optional[dict]]:
+        if not ids:
+            return []
+        try:
+            raw = await self.redis.mget([self._key(index, id) for id in ids])
+        except RedisError as e:
+            logger.warning("entity cache read failed: %s", e)
+            raw = [None] * len(ids)
+        sources = [None if item is None else orjson.loads(item) for item in raw]
+        hits = sum(source is not None for source in sources)
+        metrics.inc("cache.entity.hits", hits)
+        metrics.inc("cache.entity.misses", len(ids) - hits)
+        return sources
+
+    async def set_many(self, index: str, sources: dict[str, dict]) -> None:
+        if not sources:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for id, source in sources.items():
+                    pipe.set(self._key(index, id), orjson.dumps(source), ex=self.expire)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning("entity cache write failed: %s", e)
+
+
+entity_cache: Optional[EntityCache] = None
+
+
+async def get_entity_cache() -> Optional[EntityCache]:
+    return entity_cache
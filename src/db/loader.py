@@ -0,0 +1,82 @@
+import asyncio
+from typing import Optional
+
+from elasticsearch import AsyncElasticsearch, exceptions
+
+from core.config import ES_MGET_MAX_BATCH, ES_MGET_WINDOW_US
+from core.metrics import metrics
+
+
+class MGetLoader:
+    """
+    Collects document lookups of one index arriving within `window_us`
+    microseconds, or until `max_batch` ids are pending, and resolves them
+    with a single mget. Missing documents resolve to None.
+    """
+
+    def __init__(
+        self,
+        es: AsyncElasticsearch,
+        index: str,
+        source_includes: Optional[list[str]] = None,
+        window_us: int = ES_MGET_WINDOW_US,
+        max_batch: int = ES_MGET_MAX_BATCH,
+    ):
+        self.es = es
+        self.index = index
+        self.source_includes = source_includes
+        self.window = window_us / 1_000_000
+        self.max_batch = max_batch
+        self._pending: dict[str, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # running fetches, referenced so they are not garbage collected
+        self._fetches: set[asyncio.Task] = set()
+
+    async def load(self, id: str) -> Optional[dict]:
+        fut = self._pending.get(id)
+        if fut is None:
+            loop = asyncio.get_running_loop()
+            fut = loop.create_future()
+            self._pending[id] = fut
+            if len(self._pending) >= self.max_batch:
+                self._dispatch()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._dispatch)
+        # shield keeps the future alive for other callers of the same id
+        return await asyncio.shield(fut)
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.ensure_future(self._fetch(batch))
+            self._fetches.add(task)
+            task.add_done_callback(self._fetches.discard)
+
+    async def _fetch(self, batch: dict[str, asyncio.Future]) -> None:
+        metrics.observe("es.mget.batch_size", len(batch))
+        try:
+            resp = await self.es.mget(
+                index=self.index,
+                ids=list(batch),
+                source_includes=self.source_includes,
+            )
+        except exceptions.NotFoundError:
+            # index does not exist
+            docs = []
+        except Exception as e:
+            for fut in batch.values():
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        else:
+            docs = resp["docs"]
+        for doc in docs:
+            fut = batch.get(doc["_id"])
+            if fut is not None and not fut.done():
+                fut.set_result(doc if doc.get("found") else None)
+        for fut in batch.values():
+            if not fut.done():
+                fut.set_result(None)
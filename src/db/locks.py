@@ -0,0 +1,41 @@
+import secrets
+from typing import Optional
+
+from aioredis import Redis
+
+
+class RedisLock:
+    """
+    Lock of a key in redis, shared by workers, which expires after `timeout`
+    seconds. The key holds a random token of the owner and is released only
+    with that token, so a lock which expired and was taken by another worker
+    stays with it.
+    """
+
+    _release_script = """
+    if redis.call("GET", KEYS[1]) == ARGV[1] then
+        return redis.call("DEL", KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, redis: Redis, key: str, timeout: float):
+        self.redis = redis
+        self.key = key
+        self.timeout = timeout
+        self._token: Optional[str] = None
+
+    async def acquire(self) -> bool:
+        token = secrets.token_hex(16)
+        if not await self.redis.set(
+            self.key, token, nx=True, px=max(int(self.timeout * 1000), 1)
+        ):
+            return False
+        self._token = token
+        return True
+
+    async def release(self) -> None:
+        if self._token is None:
+            return
+        token, self._token = self._token, None
+        await self.redis.eval(self._release_script, 1, self.key, token)
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import math
+import struct
+from hashlib import blake2b
+from typing import Iterable, Optional
+
+from aioredis import Redis
+from aioredis.exceptions import RedisError
+from elasticsearch import exceptions
+
+from core.config import (
+    BLOOM_FILTER_ERROR_RATE,
+    BLOOM_FILTER_LOCK_TIMEOUT,
+    BLOOM_FILTER_REBUILD_INTERVAL,
+    NOT_FOUND_CACHE_EXPIRE,
+)
+from core.metrics import metrics
+from db.elastic import ESStorage
+from db.locks import RedisLock
+from db.versions import IndexVersions, index_versions
+
+logger = logging.getLogger(__name__)
+
+# size and number of hashes of a serialized Bloom filter
+_HEADER = struct.Struct(">QI")
+
+
+class BloomFilter:
+    """Set of strings with false positives, but without false negatives"""
+
+    def __init__(self, capacity: int, error_rate: float = BLOOM_FILTER_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big")
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item)
+        )
+
+    def dumps(self) -> bytes:
+        return _HEADER.pack(self.size, self.hashes) + bytes(self._bits)
+
+    @classmethod
+    def loads(cls, data: bytes) -> "BloomFilter":
+        ids = cls.__new__(cls)
+        ids.size, ids.hashes = _HEADER.unpack_from(data)
+        ids._bits = bytearray(data[_HEADER.size :])  # noqa: E203
+        return ids
+
+
+class NotFoundCache:
+    """
+    Remembers ids which were not found, for NOT_FOUND_CACHE_EXPIRE seconds
+    and until index data changes. Optionally keeps a Bloom filter of all ids
+    of every index, so unknown ids are rejected without going to redis or
+    ES. After index data changes one worker at a time rebuilds the filter
+    from a scroll over the index and shares it through redis, the others
+    load it from there.
+    """
+
+    prefix = "not-found"
+
+    def __init__(
+        self,
+        redis: Redis,
+        expire: int = NOT_FOUND_CACHE_EXPIRE,
+        versions: IndexVersions = index_versions,
+        lock_timeout: int = BLOOM_FILTER_LOCK_TIMEOUT,
+    ):
+        self.redis = redis
+        self.expire = expire
+        self.versions = versions
+        self.lock_timeout = lock_timeout
+        # index -> (data version the filter was built for, filter)
+        self._filters: dict[str, tuple[str, BloomFilter]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _key(self, index: str, id: str) -> str:
+        return "{p}:{i}:{v}:{id}".format(
+            p=self.prefix, i=index, v=self.versions.get(index), id=id
+        )
+
+    def definitely_missing(self, index: str, id: str) -> bool:
+        """True if Bloom filter of current index data has no such id"""
+        version, ids = self._filters.get(index, (None, None))
+        return version == self.versions.get(index) and id not in ids
+
+    async def is_missing(self, index: str, id: str) -> bool:
+        if self.definitely_missing(index, id):
+            metrics.inc("cache.not_found.bloom_hits")
+            return True
+        try:
+            missing = await self.redis.get(self._key(index, id)) is not None
+        except RedisError as e:
+            logger.warning("not found cache read failed: %s", e)
+            return False
+        if missing:
+            metrics.inc("cache.not_found.hits")
+        return missing
+
+    async def add(self, index: str, id: str) -> None:
+        try:
+            await self.redis.set(self._key(index, id), 1, ex=self.expire)
+        except RedisError as e:
+            logger.warning("not found cache write failed: %s", e)
+
+    def _filter_key(self, index: str) -> str:
+        return "{p}:bloom:{i}".format(p=self.prefix, i=index)
+
+    async def refresh(self, storage: ESStorage, index: str) -> None:
+        """
+        Makes the filter of index current: loads it from redis if another
+        worker has built it for the current version, builds it otherwise
+        """
+        version = self.versions.get(index)
+        key = self._filter_key(index)
+        # one read, so the filter is of the version read with it
+        shared_version, data = await self.redis.hmget(key, ["version", "filter"])
+        if shared_version is not None and shared_version.decode() == version:
+            ids = BloomFilter.loads(data)
+            self._filters[index] = (version, ids)
+            metrics.inc("cache.not_found.bloom_loads")
+            return
+        lock = RedisLock(self.redis, "{k}:lock".format(k=key), self.lock_timeout)
+        if not await lock.acquire():
+            # being rebuilt by another worker
+            return
+        try:
+            await self.rebuild(storage, index)
+        finally:
+            await lock.release()
+
+    async def rebuild(self, storage: ESStorage, index: str) -> None:
+        version = self.versions.get(index)
+        ids = BloomFilter(await storage.count(index))
+        async for id in storage.scan_ids(index):
+            ids.add(id)
+        self._filters[index] = (version, ids)
+        await self.redis.hset(
+            self._filter_key(index), mapping={"version": version, "filter": ids.dumps()}
+        )
+        metrics.inc("cache.not_found.bloom_rebuilds")
+        logger.info("bloom filter of %s is rebuilt for version %s", index, version)
+
+    async def start_filters(
+        self,
+        storage: ESStorage,
+        indices: Iterable[str],
+        interval: float = BLOOM_FILTER_REBUILD_INTERVAL,
+    ) -> None:
+        self._task = asyncio.create_task(self._watch(storage, list(indices), interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _watch(self, storage: ESStorage, indices: list[str], interval: float):
+        while True:
+            for index in indices:
+                built_for, _ = self._filters.get(index, (None, None))
+                if built_for == self.versions.get(index):
+                    continue
+                try:
+                    await self.refresh(storage, index)
+                except (
+                    exceptions.ApiError,
+                    exceptions.TransportError,
+                    RedisError,
+                ) as e:
+                    logger.warning("failed to rebuild bloom filter of %s: %s", index, e)
+            await asyncio.sleep(interval)
+
+
+not_found: Optional[NotFoundCache] = None
+
+
+async def get_not_found() -> Optional[NotFoundCache]:
+    return not_found
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from time import monotonic
+from typing import AsyncIterator, Optional
+
+from elasticsearch import AsyncElasticsearch, exceptions
+
+from core.config import ES_PIT_KEEP_ALIVE, ES_PIT_REFRESH_AFTER
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PointInTime:
+    # ES may return a new id with any search, users keep the latest one here
+    id: str
+    index: str
+    opened_at: float
+    # data version of index the snapshot was opened at, or after
+    version: Optional[str] = None
+    users: int = 0
+    uses: int = 0
+    retired: bool = False
+
+
+class PitPool:
+    """
+    Keeps one live point in time per index and shares it between concurrent
+    paginators. PIT is reopened once it is older than `refresh_after` or
+    index data version differs from the one it was opened at, the retired
+    one is closed when its last user is done.
+    """
+
+    def __init__(
+        self,
+        es: AsyncElasticsearch,
+        keep_alive: str = ES_PIT_KEEP_ALIVE,
+        refresh_after: float = ES_PIT_REFRESH_AFTER,
+    ):
+        self.es = es
+        self.keep_alive = keep_alive
+        self.refresh_after = refresh_after
+        self._live: dict[str, PointInTime] = {}
+        self._locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    @asynccontextmanager
+    async def acquire(
+        self, index: str, version: Optional[str] = None
+    ) -> AsyncIterator[PointInTime]:
+        pit = await self._get(index, version)
+        pit.users += 1
+        pit.uses += 1
+        if pit.uses > 1:
+            metrics.inc("es.pit.reused")
+        try:
+            yield pit
+        except exceptions.NotFoundError:
+            # pit expired or was closed by cluster
+            metrics.inc("es.pit.errors")
+            self._retire(pit)
+            raise
+        finally:
+            pit.users -= 1
+            if pit.retired and not pit.users:
+                await self._close(pit)
+
+    async def close(self) -> None:
+        for pit in list(self._live.values()):
+            self._retire(pit)
+            if not pit.users:
+                await self._close(pit)
+
+    def _is_fresh(self, pit: PointInTime, version: Optional[str]) -> bool:
+        return (
+            pit.version == version and monotonic() - pit.opened_at < self.refresh_after
+        )
+
+    async def _get(self, index: str, version: Optional[str]) -> PointInTime:
+        pit = self._live.get(index)
+        if pit is not None and self._is_fresh(pit, version):
+            return pit
+        async with self._locks[index]:
+            pit = self._live.get(index)
+            if pit is not None:
+                if self._is_fresh(pit, version):
+                    return pit
+                self._retire(pit)
+                if not pit.users:
+                    await self._close(pit)
+            try:
+                resp = await self.es.open_point_in_time(
+                    index=index, keep_alive=self.keep_alive
+                )
+            except exceptions.ApiError:
+                metrics.inc("es.pit.errors")
+                raise
+            metrics.inc("es.pit.opened")
+            pit = PointInTime(
+                id=resp["id"], index=index, opened_at=monotonic(), version=version
+            )
+            self._live[index] = pit
+            return pit
+
+    def _retire(self, pit: PointInTime) -> None:
+        pit.retired = True
+        if self._live.get(pit.index) is pit:
+            del self._live[pit.index]
+
+    async def _close(self, pit: PointInTime) -> None:
+        metrics.observe("es.pit.lifetime", monotonic() - pit.opened_at)
+        metrics.observe("es.pit.uses", pit.uses)
+        try:
+            await self.es.close_point_in_time(id=pit.id)
+        except exceptions.NotFoundError:
+            # expired while idle, nothing to close
+            metrics.inc("es.pit.expired")
+        except exceptions.ApiError as e:
+            metrics.inc("es.pit.errors")
+            logger.warning("failed to close pit of %s: %s", pit.index, e)
+        else:
+            metrics.inc("es.pit.closed")
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Optional
+
+from aioredis import Redis
+from aioredis.exceptions import RedisError
+from elasticsearch import exceptions
+
+from core.config import (
+    FILM_RANKINGS_LOCK_TIMEOUT,
+    FILM_RANKINGS_REFRESH_INTERVAL,
+)
+from core.metrics import metrics
+from db.elastic import ESStorage
+from db.locks import RedisLock
+from db.versions import IndexVersions, index_versions
+
+logger = logging.getLogger(__name__)
+
+ORDERS = ("asc", "desc")
+
+
+class FilmRankings:
+    """
+    Film ids ordered by rating in redis sorted sets, one for all films and
+    one per genre, in both orders. Order matches ES sorting by imdb_rating
+    and then id: ties are ordered by id and films without rating go last.
+    The view is updated by one worker after movies data changes: slim
+    documents are read from ES and only films that changed since the last
+    update are written, in one transaction. Pages are served only while the
+    view reflects the current data version, otherwise callers go to ES.
+    The current version is the one this worker knows from `versions`, so
+    pages lag ES writes by up to the version poll interval plus its ttl.
+    """
+
+    prefix = "film-rankings"
+    index = "movies"
+
+    def __init__(
+        self,
+        redis: Redis,
+        versions: IndexVersions = index_versions,
+        lock_timeout: int = FILM_RANKINGS_LOCK_TIMEOUT,
+    ):
+        self.redis = redis
+        self.versions = versions
+        self.lock_timeout = lock_timeout
+        self.version_key = "{p}:version".format(p=self.prefix)
+        self.lock_key = "{p}:lock".format(p=self.prefix)
+        # film id -> entry ranked films are in, see `_entry`
+        self.films_key = "{p}:films".format(p=self.prefix)
+        self._task: Optional[asyncio.Task] = None
+
+    def _key(self, order: str, genre_id: Optional[str] = None) -> str:
+        scope = "all" if genre_id is None else "genre:{g}".format(g=genre_id)
+        return "{p}:{o}:{s}".format(p=self.prefix, o=order, s=scope)
+
+    async def page(
+        self, order: str, offset: int, count: int, genre_id: Optional[str] = None
+    ) -> Optional[list[str]]:
+        """Film ids of a page, None if the view is behind current data"""
+        if offset < 0 or count <= 0:
+            # ZRANGE counts negative indices from the end of the set
+            raise ValueError("offset must be >= 0 and count > 0")
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.get(self.version_key)
+                pipe.zrange(self._key(order, genre_id), offset, offset + count - 1)
+                version, ids = await pipe.execute()
+        except RedisError as e:
+            logger.warning("film rankings read failed: %s", e)
+            return None
+        if version is None or version.decode() != self.versions.get(self.index):
+            metrics.inc("rankings.stale")
+            return None
+        metrics.inc("rankings.hits")
+        return [id.decode() for id in ids]
+
+    async def refresh(self, storage: ESStorage) -> None:
+        version = self.versions.get(self.index)
+        built_for = await self.redis.get(self.version_key)
+        if built_for is not None and built_for.decode() == version:
+            return
+        lock = RedisLock(self.redis, self.lock_key, self.lock_timeout)
+        if not await lock.acquire():
+            # updated by another worker
+            return
+        try:
+            await self._update(storage, version)
+        finally:
+            await lock.release()
+
+    async def _update(self, storage: ESStorage, version: str) -> None:
+        films = {}
+        async for sources in storage.iter_sources(
+            index=self.index,
+            sort=[{"id": {"order": "asc"}}],
+            source_includes=["id", "imdb_rating", "genres.id"],
+        ):
+            for source in sources:
+                films[source["id"]] = _entry(source)
+        ranked = {
+            id.decode(): entry.decode()
+            for id, entry in (await self.redis.hgetall(self.films_key)).items()
+        }
+        removals, additions = defaultdict(list), defaultdict(dict)
+        for id, entry in ranked.items():
+            if films.get(id) != entry:
+                for key, _ in self._scores(entry):
+                    removals[key].append(id)
+        changed = {id: entry for id, entry in films.items() if ranked.get(id) != entry}
+        for id, entry in changed.items():
+            for key, score in self._scores(entry):
+                additions[key][id] = score
+        removed = [id for id in ranked if id not in films]
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for key, ids in removals.items():
+                pipe.zrem(key, *ids)
+            for key, scores in additions.items():
+                pipe.zadd(key, scores)
+            if removed:
+                pipe.hdel(self.films_key, *removed)
+            if changed:
+                pipe.hset(self.films_key, mapping=changed)
+            pipe.set(self.version_key, version)
+            await pipe.execute()
+        metrics.inc("rankings.updates")
+        logger.info(
+            "film rankings are updated for version %s: %s changed, %s removed",
+            version,
+            len(changed),
+            len(removed),
+        )
+
+    def _scores(self, entry: str) -> list[tuple[str, float]]:
+        """Sorted sets the film of `entry` is in, with its score in each"""
+        rating, _, genres = entry.partition("|")
+        scopes = [None, *genres.split(",")] if genres else [None]
+        result = []
+        for order in ORDERS:
+            if not rating:
+                score = float("inf")
+            else:
+                score = float(rating) if order == "asc" else -float(rating)
+            result.extend((self._key(order, genre), score) for genre in scopes)
+        return result
+
+    async def start(
+        self, storage: ESStorage, interval: float = FILM_RANKINGS_REFRESH_INTERVAL
+    ) -> None:
+        self._task = asyncio.create_task(self._watch(storage, interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _watch(self, storage: ESStorage, interval: float) -> None:
+        while True:
+            try:
+                await self.refresh(storage)
+            except (exceptions.ApiError, exceptions.TransportError, RedisError) as e:
+                logger.warning("failed to update film rankings: %s", e)
+            await asyncio.sleep(interval)
+
+
+def _entry(source: dict) -> str:
+    """Rating and sorted genre ids of a film, e.g. `8.5|<id>,<id>`"""
+    rating = source.get("imdb_rating")
+    genres = sorted(genre["id"] for genre in source.get("genres") or [])
+    return "{r}|{g}".format(r="" if rating is None else rating, g=",".join(genres))
+
+
+rankings: Optional[FilmRankings] = None
+
+
+async def get_rankings() -> Optional[FilmRankings]:
+    return rankings
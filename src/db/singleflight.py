@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from time import monotonic
+from typing import Any, Awaitable, Callable, Optional
+
+import orjson
+from aioredis import Redis
+from aioredis.exceptions import RedisError
+
+from core.config import (
+    SINGLE_FLIGHT_LOCK_TIMEOUT,
+    SINGLE_FLIGHT_POLL_INTERVAL,
+    SINGLE_FLIGHT_RESULT_EXPIRE,
+)
+from core.metrics import metrics
+from db.locks import RedisLock
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Runs one call per key at a time, concurrent callers with the same key
+    await the result of the running one. With redis the call is also
+    deduplicated across workers: the worker holding the lock runs it and
+    publishes the result for a short time, the others poll for it.
+    """
+
+    prefix = "single-flight"
+
+    def __init__(
+        self,
+        redis: Optional[Redis] = None,
+        lock_timeout: float = SINGLE_FLIGHT_LOCK_TIMEOUT,
+        result_expire: float = SINGLE_FLIGHT_RESULT_EXPIRE,
+        poll_interval: float = SINGLE_FLIGHT_POLL_INTERVAL,
+    ):
+        self.redis = redis
+        self.lock_timeout = lock_timeout
+        self.result_expire = result_expire
+        self.poll_interval = poll_interval
+        self._calls: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            metrics.inc("singleflight.calls")
+            task = asyncio.ensure_future(self._run(key, fn))
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            metrics.inc("singleflight.shared")
+        # shield keeps the call alive for others if the first caller is cancelled
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # mark exception as retrieved even if nobody awaits the task anymore
+            task.exception()
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if self.redis is None:
+            return await fn()
+        lock = RedisLock(
+            self.redis, "{p}:lock:{k}".format(p=self.prefix, k=key), self.lock_timeout
+        )
+        result_key = "{p}:result:{k}".format(p=self.prefix, k=key)
+        try:
+            cached = await self.redis.get(result_key)
+            if cached is not None:
+                metrics.inc("singleflight.shared_across_workers")
+                return orjson.loads(cached)
+            locked = await lock.acquire()
+        except RedisError as e:
+            logger.warning("single flight redis lock failed: %s", e)
+            return await fn()
+
+        deadline = monotonic() + self.lock_timeout
+        while not locked:
+            if monotonic() >= deadline:
+                metrics.inc("singleflight.wait_timeouts")
+                return await fn()
+            await asyncio.sleep(self.poll_interval)
+            try:
+                # lock is checked first: a leader publishes before unlocking,
+                # so once the lock is gone any result is already there
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.exists(lock.key)
+                    pipe.get(result_key)
+                    lock_held, cached = await pipe.execute()
+                if cached is not None:
+                    metrics.inc("singleflight.shared_across_workers")
+                    return orjson.loads(cached)
+                if not lock_held:
+                    # leader failed without a result, take its place
+                    locked = await lock.acquire()
+            except RedisError:
+                return await fn()
+
+        try:
+            result = await fn()
+            await self._publish(result_key, result)
+            return result
+        finally:
+            await self._release(lock)
+
+    async def _publish(self, result_key: str, result: Any) -> None:
+        body = getattr(result, "body", result)
+        try:
+            await self.redis.set(
+                result_key, orjson.dumps(body), px=int(self.result_expire * 1000)
+            )
+        except RedisError as e:
+            logger.warning("single flight redis publish failed: %s", e)
+
+    async def _release(self, lock: RedisLock) -> None:
+        try:
+            await lock.release()
+        except RedisError as e:
+            logger.warning("single flight redis unlock failed: %s", e)
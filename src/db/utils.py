@@ -0,0 +1,8 @@
+from hashlib import sha1
+
+import orjson
+
+
+def fingerprint(*parts) -> str:
+    """Stable hash of json-serializable parts (queries, sorts, versions)"""
+    return sha1(orjson.dumps(parts, option=orjson.OPT_SORT_KEYS)).hexdigest()
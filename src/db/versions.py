@@ -0,0 +1,114 @@
+import asyncio
+import logging
+from typing import Iterable, Optional
+
+from aioredis import Redis
+from aioredis.exceptions import RedisError
+from elasticsearch import exceptions
+
+from core.config import INDEX_VERSION_POLL_INTERVAL
+from core.metrics import metrics
+from db.elastic import ESStorage
+
+logger = logging.getLogger(__name__)
+
+
+class IndexVersions:
+    """
+    Last known data version of every index. Kept in process memory to be
+    readable synchronously, e.g. by cache key builders
+    """
+
+    def __init__(self):
+        self._versions: dict[str, str] = {}
+
+    def get(self, index: str) -> str:
+        return self._versions.get(index, "0")
+
+    def set(self, index: str, version: str) -> None:
+        self._versions[index] = version
+
+
+index_versions = IndexVersions()
+
+
+class IndexVersionWatcher:
+    """
+    Polls data versions of indices into `index_versions`. Version combines
+    a generation, incremented in redis whenever ES refresh stats of index
+    change (so versions never repeat after counters are reset), with a
+    counter which ETL may bump explicitly with
+    `INCR index-version:<index>:bump`.
+    The combined version is published to `index-version:<index>`.
+    """
+
+    prefix = "index-version"
+    # KEYS: last seen stats token, generation; ARGV: current stats token
+    _generation_script = """
+    if redis.call("GET", KEYS[1]) ~= ARGV[1] then
+        redis.call("SET", KEYS[1], ARGV[1])
+        return redis.call("INCR", KEYS[2])
+    end
+    return tonumber(redis.call("GET", KEYS[2]) or 0)
+    """
+
+    def __init__(
+        self,
+        storage: ESStorage,
+        redis: Redis,
+        indices: Iterable[str],
+        interval: float = INDEX_VERSION_POLL_INTERVAL,
+        versions: IndexVersions = index_versions,
+    ):
+        self.storage = storage
+        self.redis = redis
+        self.indices = list(indices)
+        self.interval = interval
+        self.versions = versions
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await self.poll()
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def poll(self) -> None:
+        for index in self.indices:
+            try:
+                version = await self._version(index)
+            except (exceptions.ApiError, exceptions.TransportError, RedisError) as e:
+                logger.warning("failed to get version of %s: %s", index, e)
+                continue
+            if version != self.versions.get(index):
+                logger.info("index %s version is %s", index, version)
+                metrics.inc("index_versions.changed")
+                self.versions.set(index, version)
+
+    async def _version(self, index: str) -> str:
+        try:
+            stats_version = await self.storage.index_version(index)
+        except exceptions.NotFoundError:
+            stats_version = "missing"
+        generation = await self.redis.eval(
+            self._generation_script,
+            2,
+            "{p}:{i}:stats".format(p=self.prefix, i=index),
+            "{p}:{i}:generation".format(p=self.prefix, i=index),
+            stats_version,
+        )
+        bump = await self.redis.get("{p}:{i}:bump".format(p=self.prefix, i=index))
+        version = "{g}:{b}".format(g=generation, b=int(bump) if bump is not None else 0)
+        await self.redis.set("{p}:{i}".format(p=self.prefix, i=index), version)
+        return version
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.poll()
+
+
+watcher: IndexVersionWatcher
@@ -6,12 +6,23 @@ from elasticsearch import AsyncElasticsearch
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
 
 from api.v1 import films, genres, persons
-from core import config
+from api.v1.cache import canonical_key_builder
+from core import config, warmer
 from core.logger import LOGGING
-from db import elastic, redis
+from core.metrics import metrics
+from db import (
+    checkpoints,
+    elastic,
+    entities,
+    notfound,
+    rankings,
+    redis,
+    versions,
+)
+from db.cache import TwoTierBackend
+from db.singleflight import SingleFlight
 
 app = FastAPI(
     title=config.PROJECT_NAME,
@@ -28,14 +39,43 @@ async def startup():
     Подключиться можем при работающем event-loop
     Поэтому логика подключения происходит в асинхронной функции
     """
+    if config.CURSOR_SECRET is None:
+        raise RuntimeError("CURSOR_SECRET must be set to sign page cursors")
     redis.redis = await aioredis.from_url(
         f"redis://{config.REDIS_HOST}:{config.REDIS_PORT}"
     )
     _es = AsyncElasticsearch(
         hosts=[f"http://{config.ELASTIC_HOST}:{config.ELASTIC_PORT}"]
     )
-    elastic.es = elastic.ESStorage(elastic=_es)
-    FastAPICache.init(RedisBackend(redis.redis), prefix="fastapi-cache")
+    elastic.es = elastic.ESStorage(
+        elastic=_es,
+        singleflight=SingleFlight(
+            redis=redis.redis if config.SINGLE_FLIGHT_REDIS else None
+        ),
+    )
+    checkpoints.checkpoints = checkpoints.CheckpointStore(redis=redis.redis)
+    if config.ENTITY_CACHE_ENABLED:
+        entities.entity_cache = entities.EntityCache(redis=redis.redis)
+    notfound.not_found = notfound.NotFoundCache(redis=redis.redis)
+    versions.watcher = versions.IndexVersionWatcher(
+        storage=elastic.es, redis=redis.redis, indices=("movies", "genres", "persons")
+    )
+    await versions.watcher.start()
+    if config.BLOOM_FILTER_ENABLED:
+        await notfound.not_found.start_filters(
+            storage=elastic.es, indices=("movies", "genres", "persons")
+        )
+    if config.FILM_RANKINGS_ENABLED:
+        rankings.rankings = rankings.FilmRankings(redis=redis.redis)
+        await rankings.rankings.start(storage=elastic.es)
+    cache_backend = TwoTierBackend(redis.redis)
+    await cache_backend.start()
+    FastAPICache.init(
+        cache_backend, prefix="fastapi-cache", key_builder=canonical_key_builder
+    )
+    if config.CACHE_WARMER_ENABLED:
+        warmer.warmer = warmer.CacheWarmer(app, redis.redis)
+        await warmer.warmer.start()
 
 
 @app.on_event("shutdown")
@@ -43,10 +83,23 @@ async def shutdown():
     """
     Отключаемся от баз при выключении сервера
     """
+    if warmer.warmer is not None:
+        await warmer.warmer.stop()
+    if rankings.rankings is not None:
+        await rankings.rankings.stop()
+    await notfound.not_found.stop()
+    await versions.watcher.stop()
+    await FastAPICache.get_backend().stop()
     await redis.redis.close()
     await elastic.es.close()
 
 
+@app.get("/api/metrics", include_in_schema=False)
+async def get_metrics() -> dict:
+    """Counters and summaries collected by the current worker"""
+    return metrics.snapshot()
+
+
 app.include_router(films.router, prefix="/api/v1/films", tags=["film"])
 app.include_router(genres.router, prefix="/api/v1/genres", tags=["genre"])
 app.include_router(persons.router, prefix="/api/v1/persons", tags=["person"])
@@ -5,10 +5,13 @@ from .genre import BaseGenre
 from .person import BasePerson
 
 
-class Film(BaseModel):
+class BaseFilm(BaseModel):
+    title: str
     imdb_rating: Optional[float]
+
+
+class Film(BaseFilm):
     genres: list[BaseGenre]
-    title: str
     description: Optional[str]
     actors: list[BasePerson]
     writers: list[BasePerson]
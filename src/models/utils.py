@@ -1,7 +1,76 @@
+import logging
+from functools import lru_cache
+from random import random
+from typing import Any, Callable, Optional, Type
+
 from orjson import dumps
+from pydantic import BaseModel as PydanticBaseModel
+from pydantic import ValidationError
+from pydantic.fields import SHAPE_SINGLETON
+
+from core.config import IS_DEBUG, MODEL_VALIDATION_SAMPLE_RATE
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
 
 
 def orjson_dumps(v, *, default):
     # orjson.dumps возвращает bytes, а pydantic требует unicode,
     # поэтому декодируем
     return dumps(v, default=default).decode()
+
+
+@lru_cache()
+def source_fields(
+    model: Type[PydanticBaseModel], fields: Optional[tuple[str, ...]] = None
+) -> list[str]:
+    """Top level document fields the model (or only its `fields`) is parsed from"""
+    return [
+        field.alias
+        for name, field in model.__fields__.items()
+        if fields is None or name in fields
+    ]
+
+
+@lru_cache()
+def trusted_parser(model: Type[PydanticBaseModel]) -> Callable[[dict], Any]:
+    """
+    Function building `model` from a document of our own strictly mapped
+    index without validation, nested models included. Values are kept as
+    stored, e.g. uuids stay strings.
+    """
+    fields = []
+    for name, field in model.__fields__.items():
+        nested = None
+        if isinstance(field.type_, type) and issubclass(field.type_, PydanticBaseModel):
+            nested = trusted_parser(field.type_)
+        fields.append((name, field.alias, nested, field.shape != SHAPE_SINGLETON))
+
+    def parse(data: dict):
+        values = {}
+        for name, alias, nested, many in fields:
+            if alias not in data:
+                continue
+            value = data[alias]
+            if nested is not None and value is not None:
+                value = [nested(item) for item in value] if many else nested(value)
+            values[name] = value
+        return model.construct(**values)
+
+    return parse
+
+
+def parse_source(model: Type[PydanticBaseModel], data: dict):
+    """
+    `model` from storage document. MODEL_VALIDATION_SAMPLE_RATE of documents
+    are validated, invalid ones are logged and raise in debug mode.
+    """
+    if MODEL_VALIDATION_SAMPLE_RATE and random() < MODEL_VALIDATION_SAMPLE_RATE:
+        try:
+            return model.parse_obj(data)
+        except ValidationError:
+            metrics.inc("models.validation_errors")
+            logger.exception("invalid %s document", model.__name__)
+            if IS_DEBUG:
+                raise
+    return trusted_parser(model)(data)
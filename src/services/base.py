@@ -1,58 +1,304 @@
 from abc import ABC, abstractmethod
-from typing import Optional, Type
+from functools import lru_cache
+from typing import AsyncIterator, Optional, Type
 from uuid import UUID
 
-from db.base import BaseStorage, QueryParam, SortFieldOption, SortParam
+from core.config import QUERY_TEMPLATES_CACHE_SIZE
+from db.base import BaseStorage, QueryParam
+from db.checkpoints import CheckpointStore
+from db.entities import EntityCache
+from db.notfound import NotFoundCache
+from db.utils import fingerprint
 from models.base import BaseModel
+from models.utils import parse_source, source_fields
+from services.cursors import decode_cursor, encode_cursor
 from services.paginators import BasePaginator
+from services.templates import QueryTemplate, Slot, compile_template
 
 CACHE_EXPIRE_IN_SECONDS = 1
 
 
 class BaseService(ABC):
-    def __init__(self, storage: BaseStorage, paginator: Type[BasePaginator]):
+    def __init__(
+        self,
+        storage: BaseStorage,
+        paginator: Type[BasePaginator],
+        checkpoints: Optional[CheckpointStore] = None,
+        entities: Optional[EntityCache] = None,
+        not_found: Optional[NotFoundCache] = None,
+    ):
         self.storage = storage
         self.paginator = paginator
+        self.checkpoints = checkpoints
+        self.entities = entities
+        self.not_found = not_found
+        # compiled query templates of this service, see `_compile_template`
+        self._template = lru_cache(maxsize=QUERY_TEMPLATES_CACHE_SIZE)(
+            self._compile_template
+        )
 
     async def get_by(
-        self, page_number: int, page_size: int, sort: Optional[str] = None, **kwargs
+        self,
+        page_number: int,
+        page_size: int,
+        sort: Optional[str] = None,
+        result_class: Optional[Type[BaseModel]] = None,
+        parse: bool = True,
+        fields: Optional[tuple[str, ...]] = None,
+        **kwargs,
     ):
+        """
+        Page of documents parsed into `result_class`, only fields of
+        `result_class` (or only `fields` of it) are fetched from storage.
+        `result_class` defaults to `_result_class`.
+        With entity cache only ids are searched, documents come from the cache.
+        Without `parse` raw `_source` dicts are returned.
+        """
+        result_class = result_class or self._result_class()
+        paginator = await self._make_paginator(
+            page_size=page_size,
+            sort=sort,
+            result_class=result_class,
+            fields=fields,
+            **kwargs,
+        )
+        resp = await paginator.get_page(page_number=page_number)
+        return await self._load_hits(resp, result_class, parse)
+
+    async def get_by_cursor(
+        self,
+        after: Optional[str],
+        page_size: int,
+        sort: Optional[str] = None,
+        result_class: Optional[Type[BaseModel]] = None,
+        parse: bool = True,
+        fields: Optional[tuple[str, ...]] = None,
+        **kwargs,
+    ) -> tuple[list[BaseModel], Optional[str]]:
+        """
+        Page starting after the `after` cursor (or from the beginning if it is
+        empty) and a cursor for the next page, None if there are no more hits
+        """
+        result_class = result_class or self._result_class()
+        paginator = await self._make_paginator(
+            page_size=page_size,
+            sort=sort,
+            result_class=result_class,
+            fields=fields,
+            **kwargs,
+        )
+        query_fingerprint = fingerprint(
+            self._index_name(),
+            paginator.query,
+            paginator.sort,
+        )
+        search_after = decode_cursor(after, query_fingerprint) if after else None
+        resp = await paginator.get_page_after(search_after=search_after)
+        hits = resp["hits"]["hits"]
+        next_cursor = None
+        if hits and len(hits) == page_size:
+            next_cursor = encode_cursor(query_fingerprint, hits[-1]["sort"])
+        return await self._load_hits(resp, result_class, parse), next_cursor
 
-        _sort = SortParam(fields=[{"_score": SortFieldOption(order="desc")}])
-        order = "desc"
+    async def _make_paginator(
+        self,
+        page_size: int,
+        result_class: Type[BaseModel],
+        sort: Optional[str] = None,
+        fields: Optional[tuple[str, ...]] = None,
+        **kwargs,
+    ) -> BasePaginator:
+        kwargs = await self._filters(**kwargs)
+        template = self._template(
+            sort, tuple((name, value is None) for name, value in kwargs.items())
+        )
+        return self.paginator(
+            query=template.render(kwargs),
+            sort=template.sort,
+            storage=self.storage,
+            index=self._index_name(),
+            page_size=page_size,
+            checkpoints=self.checkpoints,
+            **self._source_args(result_class, fields),
+        )
+
+    async def _filters(self, **kwargs) -> dict:
+        """
+        Filters of a query as `_query_by_*` method names with values, lets
+        services pick the method depending on storage state
+        """
+        return kwargs
+
+    def _compile_template(self, sort: Optional[str], params: tuple) -> QueryTemplate:
+        """
+        Query and sort of one shape: sort and names of `_query_by_*` filters
+        with flags whether their value is None. Filter values become slots.
+        """
+        _sort = [{"_score": {"order": "desc"}}]
         if sort is not None:
+            order = "desc"
             if sort.startswith("-"):
                 order = "asc"
                 sort = sort.removeprefix("-")
-            _sort.fields.insert(0, {sort: SortFieldOption(order=order)})
+            _sort.insert(0, {sort: {"order": order}})
+        if "id" not in [next(iter(s)) for s in _sort]:
+            _sort.append({"id": {"order": "asc"}})
         _query = QueryParam()
-        if "id" not in [list(s.keys())[0] for s in _sort.fields]:
-            _sort.fields.append({"id": SortFieldOption(order="asc")})
-        for method, value in kwargs.items():
+        for method, is_none in params:
             method_name = "_query_by_{m}".format(m=method)
+            value = None if is_none else Slot(method)
             _query = getattr(self, method_name)(value=value, query=_query)
+        if not _query.bool_.scored:
+            # all scores are equal without scoring clauses, sorting by _score
+            # would only make ES compute them
+            _sort = [s for s in _sort if "_score" not in s]
+        return compile_template(_query.dict(by_alias=True), _sort)
 
-        paginator = self.paginator(
-            query=_query,
-            sort=_sort,
-            storage=self.storage,
+    def _source_args(
+        self, result_class: Type[BaseModel], fields: Optional[tuple[str, ...]] = None
+    ) -> dict:
+        if self.entities is not None:
+            return {"fetch_source": False}
+        return {"source_includes": source_fields(result_class, fields)}
+
+    async def _load_hits(
+        self, resp: dict, result_class: Type[BaseModel], parse: bool = True
+    ) -> list[BaseModel]:
+        hits = resp["hits"]["hits"]
+        if self.entities is None:
+            results_src = [datum["_source"] for datum in hits]
+        else:
+            results_src = await self._cached_sources([datum["_id"] for datum in hits])
+        # documents deleted between search and lookup are skipped
+        results_src = [src for src in results_src if src is not None]
+        if not parse:
+            return results_src
+        return [parse_source(result_class, src) for src in results_src]
+
+    async def _load_ids(
+        self,
+        ids: list[str],
+        result_class: Type[BaseModel],
+        parse: bool = True,
+        fields: Optional[tuple[str, ...]] = None,
+    ) -> list[BaseModel]:
+        """Documents of ids in their order, like `_load_hits` for search hits"""
+        if self.entities is None:
+            docs = await self.storage.get_by_ids(
+                self._index_name(), ids, source_fields(result_class, fields)
+            )
+            results_src = [None if doc is None else doc["_source"] for doc in docs]
+        else:
+            results_src = await self._cached_sources(ids)
+        results_src = [src for src in results_src if src is not None]
+        if not parse:
+            return results_src
+        return [parse_source(result_class, src) for src in results_src]
+
+    async def _cached_sources(self, ids: list[str]) -> list[Optional[dict]]:
+        """
+        Full `_source` of documents from entity cache, missing ones are
+        fetched from storage and cached
+        """
+        index = self._index_name()
+        sources = await self.entities.get_many(index, ids)
+        missing = list(dict.fromkeys(i for i, src in zip(ids, sources) if src is None))
+        if not missing:
+            return sources
+        includes = source_fields(self._result_class())
+        if len(missing) == 1:
+            # single lookups are batched by storage with concurrent ones
+            docs = [await self.storage.get_by_id(index, missing[0], includes)]
+        else:
+            docs = await self.storage.get_by_ids(index, missing, includes)
+        fetched = {i: doc["_source"] for i, doc in zip(missing, docs) if doc}
+        await self.entities.set_many(index, fetched)
+        return [
+            src if src is not None else fetched.get(i) for i, src in zip(ids, sources)
+        ]
+
+    async def get_by_id(
+        self,
+        entity_id: UUID,
+        result_class: Optional[Type[BaseModel]] = None,
+        parse: bool = True,
+        fields: Optional[tuple[str, ...]] = None,
+    ) -> Optional[BaseModel]:
+        """
+        Entity by id, None if unknown. Unknown ids are remembered for a while.
+        Without `parse` raw `_source` dict is returned.
+        """
+        if self.not_found is None:
+            return await self._get_by_id(entity_id, result_class, parse, fields)
+        index, id = self._index_name(), str(entity_id)
+        if await self.not_found.is_missing(index, id):
+            return None
+        entity = await self._get_by_id(entity_id, result_class, parse, fields)
+        if entity is None:
+            await self.not_found.add(index, id)
+        return entity
+
+    async def _get_by_id(
+        self,
+        entity_id: UUID,
+        result_class: Optional[Type[BaseModel]] = None,
+        parse: bool = True,
+        fields: Optional[tuple[str, ...]] = None,
+    ) -> Optional[BaseModel]:
+        result_class = result_class or self._result_class()
+        if self.entities is not None:
+            [src] = await self._cached_sources([str(entity_id)])
+        else:
+            doc = await self.storage.get_by_id(
+                index=self._index_name(),
+                id=str(entity_id),
+                source_includes=source_fields(result_class, fields),
+            )
+            src = None if doc is None else doc["_source"]
+        if src is None or not parse:
+            return src
+        return parse_source(result_class, src)
+
+    async def get_by_ids(
+        self, entity_ids: list[UUID], result_class: Optional[Type[BaseModel]] = None
+    ) -> list[Optional[BaseModel]]:
+        """Entities in order of ids, None for unknown ones"""
+        result_class = result_class or self._result_class()
+        if self.entities is not None:
+            sources = await self._cached_sources([str(i) for i in entity_ids])
+            return [
+                None if src is None else parse_source(result_class, src)
+                for src in sources
+            ]
+        docs = await self.storage.get_by_ids(
             index=self._index_name(),
-            page_size=page_size,
+            ids=[str(entity_id) for entity_id in entity_ids],
+            source_includes=source_fields(result_class),
         )
-        resp = await paginator.get_page(page_number=page_number)
-        results_src = [datum["_source"] for datum in resp["hits"]["hits"]]
-        return [self._result_class().parse_obj(src) for src in results_src]
-
-    async def get_by_id(self, entity_id: UUID) -> Optional[BaseModel]:
+        return [
+            None if doc is None else parse_source(result_class, doc["_source"])
+            for doc in docs
+        ]
 
-        doc = await self.storage.get_by_id(
+    def export(
+        self,
+        result_class: Optional[Type[BaseModel]] = None,
+        fields: Optional[tuple[str, ...]] = None,
+    ) -> AsyncIterator[list[dict]]:
+        """Raw `_source` of all documents by batches, ordered by id"""
+        return self.storage.iter_sources(
             index=self._index_name(),
-            id=str(entity_id),
+            sort=[{"id": {"order": "asc"}}],
+            source_includes=source_fields(result_class or self._result_class(), fields),
         )
-        if doc is None:
-            return None
-        else:
-            return self._result_class().parse_obj(doc["_source"])
+
+    @property
+    def index_name(self) -> str:
+        return self._index_name()
+
+    @property
+    def result_class(self) -> Type[BaseModel]:
+        return self._result_class()
 
     @abstractmethod
     def _index_name(self) -> str:
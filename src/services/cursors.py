@@ -0,0 +1,44 @@
+import hmac
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from hashlib import sha256
+
+import orjson
+
+from core.config import CURSOR_SECRET
+
+
+class CursorError(ValueError):
+    pass
+
+
+def _b64encode(data: bytes) -> str:
+    return urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(CURSOR_SECRET.encode(), payload, sha256).digest()[:16]
+
+
+def encode_cursor(query_fingerprint: str, search_after: list) -> str:
+    """Opaque signed token pointing right after the hit with given sort values"""
+    payload = orjson.dumps({"f": query_fingerprint, "s": search_after})
+    return "{p}.{s}".format(p=_b64encode(payload), s=_b64encode(_sign(payload)))
+
+
+def decode_cursor(cursor: str, query_fingerprint: str) -> list:
+    """Returns search_after values, cursor must be issued for the same query"""
+    try:
+        payload, sign = cursor.split(".")
+        payload, sign = _b64decode(payload), _b64decode(sign)
+    except ValueError as e:
+        raise CursorError("malformed cursor") from e
+    if not hmac.compare_digest(sign, _sign(payload)):
+        raise CursorError("bad cursor signature")
+    data = orjson.loads(payload)
+    if data["f"] != query_fingerprint:
+        raise CursorError("cursor belongs to another query")
+    return data["s"]
@@ -1,17 +1,70 @@
 from functools import lru_cache
-from typing import Type
+from typing import Optional, Type
 from uuid import UUID
 
 from fastapi import Depends
 
 from db.base import BaseStorage, QueryParam
+from db.checkpoints import CheckpointStore, get_checkpoints
 from db.elastic import get_elastic
+from db.entities import EntityCache, get_entity_cache
+from db.notfound import NotFoundCache, get_not_found
+from db.rankings import FilmRankings, get_rankings
+from models.base import BaseModel
 from models.film import Film
 from services.base import BaseService
 from services.paginators import ESQueryPaginator
 
+# sorts served by film rankings with their order, "-" means ascending
+RANKED_SORTS = {"imdb_rating": "desc", "-imdb_rating": "asc"}
+
 
 class FilmService(BaseService):
+    def __init__(self, *args, rankings: Optional[FilmRankings] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rankings = rankings
+
+    async def get_by(
+        self,
+        page_number: int,
+        page_size: int,
+        sort: Optional[str] = None,
+        result_class: Optional[Type[BaseModel]] = None,
+        parse: bool = True,
+        fields: Optional[tuple[str, ...]] = None,
+        **kwargs,
+    ):
+        """
+        Pages of films by rating, optionally of a genre, are taken from
+        film rankings while they are up to date, other pages from storage
+        """
+        filters = {name for name, value in kwargs.items() if value is not None}
+        if (
+            self.rankings is not None
+            and sort in RANKED_SORTS
+            and filters <= {"genre_id"}
+        ):
+            genre_id = kwargs.get("genre_id")
+            ids = await self.rankings.page(
+                order=RANKED_SORTS[sort],
+                offset=(page_number - 1) * page_size,
+                count=page_size,
+                genre_id=None if genre_id is None else str(genre_id),
+            )
+            if ids is not None:
+                return await self._load_ids(
+                    ids, result_class or self._result_class(), parse, fields
+                )
+        return await super().get_by(
+            page_number=page_number,
+            page_size=page_size,
+            sort=sort,
+            result_class=result_class,
+            parse=parse,
+            fields=fields,
+            **kwargs,
+        )
+
     def _index_name(self) -> str:
         return "movies"
 
@@ -21,7 +74,7 @@ class FilmService(BaseService):
     def _query_by_genre_id(self, value: UUID, query: QueryParam) -> QueryParam:
         # TODO look for escape function or take it from php es client
         if value is not None:
-            query.bool_.must.append(
+            query.bool_.filter.append(
                 {
                     "nested": {
                         "path": "genres",
@@ -44,6 +97,19 @@ class FilmService(BaseService):
         )
         return query
 
+    async def _filters(self, **kwargs) -> dict:
+        # flat person_ids is used once the index maps it, an index created
+        # without it is queried by nested roles
+        if kwargs.get("person_id") is not None and await self.storage.has_field(
+            self._index_name(), "person_ids"
+        ):
+            kwargs["person_ids"] = kwargs.pop("person_id")
+        return kwargs
+
+    def _query_by_person_ids(self, value: UUID, query: QueryParam) -> QueryParam:
+        query.bool_.filter.append({"term": {"person_ids": value}})
+        return query
+
     def _query_by_person_id(self, value: UUID, query: QueryParam) -> QueryParam:
         # TODO look for escape function or take from php es client
         def _q_nested(role, person_id):
@@ -53,13 +119,28 @@ class FilmService(BaseService):
 
         roles = ("actors", "directors", "writers")
 
+        # any of roles, as one filter clause, so it is not scored and stays
+        # required next to other clauses
         to_app = [_q_nested(role, value) for role in roles]
-        query.bool_.should.extend(to_app)
+        query.bool_.filter.append(
+            {"bool": {"should": to_app, "minimum_should_match": 1}}
+        )
         return query
 
 
 @lru_cache()
 def get_film_service(
     elastic: BaseStorage = Depends(get_elastic),
+    checkpoints: CheckpointStore = Depends(get_checkpoints),
+    entities: EntityCache = Depends(get_entity_cache),
+    not_found: NotFoundCache = Depends(get_not_found),
+    rankings: FilmRankings = Depends(get_rankings),
 ) -> FilmService:
-    return FilmService(storage=elastic, paginator=ESQueryPaginator)
+    return FilmService(
+        storage=elastic,
+        paginator=ESQueryPaginator,
+        checkpoints=checkpoints,
+        entities=entities,
+        not_found=not_found,
+        rankings=rankings,
+    )
@@ -4,7 +4,10 @@ from typing import Type
 from fastapi import Depends
 
 from db.base import BaseStorage
+from db.checkpoints import CheckpointStore, get_checkpoints
 from db.elastic import get_elastic
+from db.entities import EntityCache, get_entity_cache
+from db.notfound import NotFoundCache, get_not_found
 from models.genre import Genre
 from services.paginators import ESQueryPaginator
 
@@ -22,5 +25,14 @@ class GenreService(BaseService):
 @lru_cache()
 def get_genre_service(
     elastic: BaseStorage = Depends(get_elastic),
+    checkpoints: CheckpointStore = Depends(get_checkpoints),
+    entities: EntityCache = Depends(get_entity_cache),
+    not_found: NotFoundCache = Depends(get_not_found),
 ) -> GenreService:
-    return GenreService(storage=elastic, paginator=ESQueryPaginator)
+    return GenreService(
+        storage=elastic,
+        paginator=ESQueryPaginator,
+        checkpoints=checkpoints,
+        entities=entities,
+        not_found=not_found,
+    )
@@ -3,16 +3,18 @@ from math import ceil
 from typing import Optional
 
 from core.config import MAX_ES_SEARCH_FROM_SIZE
-from db.base import BaseStorage, QueryParam, SortParam
+from db.base import BaseStorage
+from db.checkpoints import CheckpointStore
 from db.elastic import ESStorage
+from db.utils import fingerprint
 
 
 class BasePaginator(ABC):
     @abstractmethod
     async def __init__(
         self,
-        query: QueryParam,
-        sort: SortParam,
+        query: dict,
+        sort: list,
         storage: BaseStorage,
         **kwargs,
     ):
@@ -22,15 +24,20 @@ class BasePaginator(ABC):
     async def get_page(self, page_number: int) -> dict:
         pass
 
+    @abstractmethod
+    async def get_page_after(self, search_after: Optional[list]) -> dict:
+        pass
+
 
 class ESQueryPaginator(BasePaginator):
     def __init__(
         self,
-        query: QueryParam,
-        sort: SortParam,
+        query: dict,
+        sort: list,
         storage: ESStorage,
         index: str,
         page_size: int,
+        checkpoints: Optional[CheckpointStore] = None,
         **kwargs,
     ):
         self.query = query
@@ -38,6 +45,8 @@ class ESQueryPaginator(BasePaginator):
         self.storage = storage
         self.index = index
         self.page_size = page_size
+        self.checkpoints = checkpoints
+        self.checkpoints_key = None
         self.accum_shift = 0
         self.search_after = None
         self.pit = None
@@ -46,44 +55,105 @@ class ESQueryPaginator(BasePaginator):
     async def get_page(self, page_number: int) -> dict:
         self.page_number = page_number
         self.search_from = (self.page_number - 1) * self.page_size
+        if self.search_from + self.page_size <= MAX_ES_SEARCH_FROM_SIZE:
+            # page is reachable with plain from/size, no point in time needed
+            return await self.storage.get_with_search(
+                query=self.query,
+                sort=self.sort,
+                from_=self.search_from,
+                size=self.page_size,
+                index=self.index,
+                **self.search_add_args,
+            )
         n = ceil(self.search_from / MAX_ES_SEARCH_FROM_SIZE)
-        self.pit = await self.storage.open_pit(index=self.index, keep_alive="1m")
-        self.pit = self.pit["id"]
-        # make shure that search after point to the beginning of page
-        for _ in range(n):
-            await self._process_inner_pag_query()
+        async with self.storage.pit(index=self.index) as pit:
+            self.pit = pit
+            if n and self.checkpoints is not None:
+                await self._restore_checkpoint()
+            try:
+                # make shure that search after point to the beginning of page
+                while self.accum_shift < self.search_from:
+                    resp = await self._process_inner_pag_query()
+                    if not resp["hits"]["hits"]:
+                        # page is beyond the last document
+                        return resp
 
-        out = await self._search_after()
-        await self.storage.close_pit(id=self.pit)
-        self.pit = None
-        return out
+                return await self._search_after()
+            finally:
+                self.pit = None
+
+    async def get_page_after(self, search_after: Optional[list]) -> dict:
+        """Page that starts right after the hit with `search_after` sort values"""
+        self.search_after = search_after
+        return await self.storage.get_with_search(
+            query=self.query,
+            sort=self.sort,
+            search_after=self.search_after,
+            size=self.page_size,
+            index=self.index,
+            **self.search_add_args,
+        )
+
+    async def _restore_checkpoint(self) -> None:
+        # checkpoints are positions in the snapshot of the pit, keyed by its
+        # data version
+        self.checkpoints_key = fingerprint(
+            self.index,
+            self.pit.version,
+            self.query,
+            self.sort,
+        )
+        boundary, search_after = await self.checkpoints.nearest(
+            self.checkpoints_key, self.search_from // MAX_ES_SEARCH_FROM_SIZE
+        )
+        if search_after is not None:
+            self.accum_shift = boundary * MAX_ES_SEARCH_FROM_SIZE
+            self.search_after = search_after
 
-    async def _process_inner_pag_query(self) -> None:
+    async def _process_inner_pag_query(self) -> dict:
         if self.search_after is None:
             resp = await self._initial_query()
         else:
             size = min(MAX_ES_SEARCH_FROM_SIZE, self.search_from - self.accum_shift)
-            resp = await self._search_after(size=size)
+            resp = await self._search_after(size=size, sort_only=True)
 
-        self.accum_shift += len(resp["hits"]["hits"])
-        self.search_after = resp["hits"]["hits"][-1]["sort"]
+        hits = resp["hits"]["hits"]
+        if not hits:
+            return resp
+        self.accum_shift += len(hits)
+        self.search_after = hits[-1]["sort"]
+        if self.checkpoints_key is not None and not (
+            self.accum_shift % MAX_ES_SEARCH_FROM_SIZE
+        ):
+            await self.checkpoints.save(
+                self.checkpoints_key,
+                self.accum_shift // MAX_ES_SEARCH_FROM_SIZE,
+                self.search_after,
+            )
+        return resp
 
-    async def _search_after(self, size: Optional[int] = None):
-        return await self.storage.get_with_search(
+    async def _search_after(self, size: Optional[int] = None, sort_only=False):
+        resp = await self.storage.get_with_search(
             query=self.query,
             sort=self.sort,
             search_after=self.search_after,
             size=size or self.page_size,
-            pit=self.pit,
+            pit=self.pit.id,
+            sort_only=sort_only,
             **self.search_add_args,
         )
+        self.storage.update_pit(self.pit, resp)
+        return resp
 
     async def _initial_query(self):
-        return await self.storage.get_with_search(
+        resp = await self.storage.get_with_search(
             query=self.query,
             sort=self.sort,
             from_=0,
             size=min(self.search_from, MAX_ES_SEARCH_FROM_SIZE),
-            pit=self.pit,
+            pit=self.pit.id,
+            sort_only=True,
             **self.search_add_args,
         )
+        self.storage.update_pit(self.pit, resp)
+        return resp
@@ -5,7 +5,10 @@ from uuid import UUID
 from fastapi import Depends
 
 from db.base import BaseStorage, QueryParam
+from db.checkpoints import CheckpointStore, get_checkpoints
 from db.elastic import get_elastic
+from db.entities import EntityCache, get_entity_cache
+from db.notfound import NotFoundCache, get_not_found
 from models.person import Person
 from services.base import BaseService
 from services.paginators import ESQueryPaginator
@@ -28,5 +31,14 @@ class PersonService(BaseService):
 @lru_cache()
 def get_person_service(
     elastic: BaseStorage = Depends(get_elastic),
+    checkpoints: CheckpointStore = Depends(get_checkpoints),
+    entities: EntityCache = Depends(get_entity_cache),
+    not_found: NotFoundCache = Depends(get_not_found),
 ) -> PersonService:
-    return PersonService(storage=elastic, paginator=ESQueryPaginator)
+    return PersonService(
+        storage=elastic,
+        paginator=ESQueryPaginator,
+        checkpoints=checkpoints,
+        entities=entities,
+        not_found=not_found,
+    )
@@ -0,0 +1,59 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+
+class Slot:
+    """Placeholder of a request parameter value in a query template"""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self) -> str:
+        return "Slot({n!r})".format(n=self.name)
+
+
+@dataclass(frozen=True)
+class QueryTemplate:
+    """
+    ES query body with slots and ready sort of one query shape. Parts
+    without slots are shared between rendered queries, which must not be
+    mutated.
+    """
+
+    query: dict
+    sort: list
+    fill: Callable[[dict], dict]
+
+    def render(self, values: dict) -> dict:
+        return self.fill(values)
+
+
+def compile_template(query: dict, sort: list) -> QueryTemplate:
+    fill = _filler(query)
+    return QueryTemplate(
+        query=query, sort=sort, fill=fill if fill is not None else lambda _: query
+    )
+
+
+def _filler(node: Any) -> Optional[Callable[[dict], Any]]:
+    """Function copying node with slots filled in, None if node has no slots"""
+    if isinstance(node, Slot):
+        name = node.name
+        return lambda values: values[name]
+    if isinstance(node, dict):
+        parts = [(key, value, _filler(value)) for key, value in node.items()]
+        if all(fill is None for _, _, fill in parts):
+            return None
+        return lambda values: {
+            key: value if fill is None else fill(values) for key, value, fill in parts
+        }
+    if isinstance(node, list):
+        parts = [(value, _filler(value)) for value in node]
+        if all(fill is None for _, fill in parts):
+            return None
+        return lambda values: [
+            value if fill is None else fill(values) for value, fill in parts
+        ]
+    return None
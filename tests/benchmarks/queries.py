@@ -0,0 +1,63 @@
+"""
+Per-request CPU cost of building ES query and sort: pydantic QueryParam
+built by `_query_by_*` filters and dumped with `.dict()` on every request
+against rendering the template compiled once per query shape.
+
+Run from the repo root: PYTHONPATH=src python tests/benchmarks/queries.py
+"""
+
+import timeit
+import uuid
+
+from services.films import FilmService
+from services.paginators import ESQueryPaginator
+
+REPEAT = 20_000
+
+SHAPES = {
+    "search": {"query": "star wars"},
+    "genre": {"genre_id": uuid.UUID(int=1)},
+    "person": {"person_id": uuid.UUID(int=2)},
+}
+
+
+def build_path(service, sort, kwargs) -> tuple[dict, list]:
+    params = tuple((name, value is None) for name, value in kwargs.items())
+    template = service._compile_template(sort, params)
+    return template.render(kwargs), template.sort
+
+
+def template_path(service, sort, kwargs) -> tuple[dict, list]:
+    params = tuple((name, value is None) for name, value in kwargs.items())
+    template = service._template(sort, params)
+    return template.render(kwargs), template.sort
+
+
+def main():
+    service = FilmService(storage=None, paginator=ESQueryPaginator)
+    for shape, kwargs in SHAPES.items():
+        assert build_path(service, "-imdb_rating", kwargs) == (
+            template_path(service, "-imdb_rating", kwargs)
+        )
+        timings = {}
+        for path in (build_path, template_path):
+            seconds = min(
+                timeit.repeat(
+                    lambda: path(service, "-imdb_rating", kwargs),
+                    number=REPEAT,
+                    repeat=5,
+                )
+            )
+            timings[path.__name__] = seconds / REPEAT * 1_000_000
+        print(
+            "{s:8} {b:.1f} us -> {t:.1f} us per request, x{x:.1f}".format(
+                s=shape,
+                b=timings["build_path"],
+                t=timings["template_path"],
+                x=timings["build_path"] / timings["template_path"],
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
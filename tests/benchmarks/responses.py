@@ -0,0 +1,79 @@
+"""
+Per-page CPU cost of building list responses: pydantic round trip
+(parse into domain model, copy into api model, jsonable_encoder) against
+projection of `_source` dicts serialized once with orjson.
+
+Run from the repo root: PYTHONPATH=src python tests/benchmarks/responses.py
+"""
+import timeit
+import uuid
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+
+from api.v1 import FilmFullInfo, PartialFilmInfo
+from api.v1.projection import projection
+from models.film import BaseFilm, Film
+
+PAGE_SIZE = 50
+REPEAT = 200
+
+
+def _person(i: int) -> dict:
+    return {"id": str(uuid.UUID(int=10_000 + i)), "name": "person {i}".format(i=i)}
+
+
+def _movie(i: int) -> dict:
+    return {
+        "id": str(uuid.UUID(int=i)),
+        "title": "film {i}".format(i=i),
+        "imdb_rating": i % 100 / 10,
+        "description": "description of film {i}".format(i=i) * 5,
+        "genres": [
+            {"id": str(uuid.UUID(int=1000 + g)), "name": "genre {g}".format(g=g)}
+            for g in range(3)
+        ],
+        "actors": [_person(i + a) for a in range(8)],
+        "writers": [_person(i + 100 + w) for w in range(2)],
+        "directors": [_person(i + 200)],
+    }
+
+
+def pydantic_path(sources, model, result_class) -> bytes:
+    items = [result_class.parse_obj(src) for src in sources]
+    return orjson.dumps(jsonable_encoder([model(**item.dict()) for item in items]))
+
+
+def projection_path(sources, model, result_class) -> bytes:
+    project = projection(model, result_class)
+    return ORJSONResponse([project(src) for src in sources]).body
+
+
+def main():
+    sources = [_movie(i) for i in range(PAGE_SIZE)]
+    for model, result_class in ((PartialFilmInfo, BaseFilm), (FilmFullInfo, Film)):
+        assert orjson.loads(pydantic_path(sources, model, result_class)) == (
+            orjson.loads(projection_path(sources, model, result_class))
+        )
+        timings = {}
+        for path in (pydantic_path, projection_path):
+            seconds = min(
+                timeit.repeat(
+                    lambda: path(sources, model, result_class), number=REPEAT, repeat=5
+                )
+            )
+            timings[path.__name__] = seconds / REPEAT * 1000
+        print(
+            "{m:16} {p:.3f} ms -> {f:.3f} ms per {n} items page, x{x:.1f}".format(
+                m=model.__name__,
+                p=timings["pydantic_path"],
+                f=timings["projection_path"],
+                n=PAGE_SIZE,
+                x=timings["pydantic_path"] / timings["projection_path"],
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -8,12 +8,13 @@ from typing import AsyncGenerator, Optional
 import aiohttp
 import pytest
 import pytest_asyncio
+from aioredis import Redis
 from elasticsearch import AsyncElasticsearch
 from multidict import CIMultiDictProxy
 
 from .settings import TestSettings
 from .test_data import constants, genres, movies, persons
-from .utils import es_load
+from .utils import es_load, with_person_ids
 
 sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
 
@@ -62,11 +63,18 @@ async def es_client() -> AsyncGenerator[AsyncElasticsearch, None]:
     await es.close()
 
 
+@pytest_asyncio.fixture(scope="session")
+async def redis_client() -> AsyncGenerator[Redis, None]:
+    redis = Redis(host=SETTINGS.redis_host, port=SETTINGS.redis_port)
+    yield redis
+    await redis.close()
+
+
 @pytest_asyncio.fixture(scope="module")
 async def es_load_data(es_client) -> None:
     idx_data_map = (
         ("genres", genres.genres),
-        ("movies", movies.movies),
+        ("movies", [with_person_ids(movie) for movie in movies.movies]),
         ("persons", persons.persons),
     )
 
@@ -86,7 +94,7 @@ async def es_load_data(es_client) -> None:
 
 @dataclass
 class HTTPResponse:
-    body: dict
+    body: Optional[dict]
     headers: CIMultiDictProxy[str]
     status: int
 
@@ -98,6 +106,38 @@ async def session(es_client):  # use es_client arg to call index creation fixtur
     await session.close()
 
 
+@pytest_asyncio.fixture(scope="session")
+async def cached_session(es_client):
+    """Session going through the api response cache, unlike `session`"""
+    session = aiohttp.ClientSession()
+    yield session
+    await session.close()
+
+
+@pytest_asyncio.fixture(scope="module")
+def make_cached_get_request(cached_session, es_load_data):
+    """Request maker with preloaded es data, responses may come from cache"""
+
+    async def inner(
+        method: str, params: Optional[dict] = None, headers: Optional[dict] = None
+    ) -> HTTPResponse:
+        url = f"http://{SETTINGS.api_host}:{SETTINGS.api_port}/api/v1/{method.lstrip('/')}"  # noqa: E501
+        async with cached_session.get(
+            url, params=params or {}, headers=headers or {}
+        ) as response:
+            return HTTPResponse(
+                body=(
+                    None
+                    if response.status == HTTPStatus.NOT_MODIFIED
+                    else await response.json()
+                ),
+                headers=response.headers,
+                status=response.status,
+            )
+
+    return inner
+
+
 @pytest_asyncio.fixture(scope="module")
 def make_get_request_empty_es(session):
     """Request maker without preloaded es data fixtures"""
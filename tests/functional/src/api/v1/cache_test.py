@@ -0,0 +1,86 @@
+from http import HTTPStatus
+
+import pytest
+from test_data import movies
+from utils import filter_uuid
+
+# All test coroutines will be treated as marked with this decorator.
+pytestmark = pytest.mark.asyncio
+
+GENRE_ID = "1f64e918-b298-11ec-90b3-00155db24537"
+FILM_ID = "1f6546ba-b298-11ec-90b3-00155db24537"
+
+
+async def test_cached_film_is_gzipped(make_cached_get_request):
+    await make_cached_get_request(f"films/{FILM_ID}")
+    response = await make_cached_get_request(
+        f"films/{FILM_ID}", headers={"Accept-Encoding": "gzip"}
+    )
+
+    assert response.status == HTTPStatus.OK
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.body == movies.expected_film_by_id
+
+
+async def test_cached_film_identity(make_cached_get_request):
+    response = await make_cached_get_request(
+        f"films/{FILM_ID}", headers={"Accept-Encoding": "identity"}
+    )
+
+    assert response.status == HTTPStatus.OK
+    assert "Content-Encoding" not in response.headers
+    assert response.body == movies.expected_film_by_id
+
+
+async def test_not_modified(make_cached_get_request):
+    first = await make_cached_get_request(f"films/{FILM_ID}")
+    response = await make_cached_get_request(
+        f"films/{FILM_ID}", headers={"If-None-Match": first.headers["ETag"]}
+    )
+
+    assert response.status == HTTPStatus.NOT_MODIFIED
+    assert response.headers["ETag"] == first.headers["ETag"]
+
+
+async def test_modified_etag(make_cached_get_request):
+    response = await make_cached_get_request(
+        f"films/{FILM_ID}", headers={"If-None-Match": '"other"'}
+    )
+
+    assert response.status == HTTPStatus.OK
+    assert response.body == movies.expected_film_by_id
+
+
+async def test_cache_status(make_cached_get_request):
+    await make_cached_get_request(f"genres/{GENRE_ID}/films")
+    response = await make_cached_get_request(f"genres/{GENRE_ID}/films")
+
+    assert response.status == HTTPStatus.OK
+    assert response.headers["X-Cache-Status"] in ("fresh", "stale")
+    assert filter_uuid(response.body) == {
+        "1f652f72-b298-11ec-90b3-00155db24537",
+        "1f651c76-b298-11ec-90b3-00155db24537",
+        "1f657e5a-b298-11ec-90b3-00155db24537",
+    }
+
+
+async def test_cache_key_of_uppercase_id(make_cached_get_request):
+    upper = await make_cached_get_request(f"genres/{GENRE_ID.upper()}/films")
+    lower = await make_cached_get_request(f"genres/{GENRE_ID}/films")
+
+    assert upper.status == HTTPStatus.OK
+    assert upper.body == lower.body
+    assert len(lower.body) == 3
+
+
+async def test_cache_key_of_search_query(make_cached_get_request):
+    plain = await make_cached_get_request("films/search", {"query": "HP"})
+    padded = await make_cached_get_request("films/search", {"query": "  HP "})
+    other = await make_cached_get_request("films/search", {"query": " SW"})
+
+    assert plain.status == HTTPStatus.OK
+    assert plain.body == padded.body
+    assert "1f650754-b298-11ec-90b3-00155db24537" in filter_uuid(padded.body)
+    # another query is not served from the entry of the first one
+    assert "1f650754-b298-11ec-90b3-00155db24537" not in filter_uuid(other.body)
+    assert "1f656672-b298-11ec-90b3-00155db24537" in filter_uuid(other.body)
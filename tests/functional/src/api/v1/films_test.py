@@ -43,6 +43,27 @@ async def test_film_by_id(make_get_request):
     assert response.body == movies.expected_film_by_id
 
 
+async def test_film_by_id_sparse_fields(make_get_request):
+    response = await make_get_request(
+        "films/1f6546ba-b298-11ec-90b3-00155db24537",
+        params={"fields[film]": "title,genres"},
+    )
+
+    assert response.status == HTTPStatus.OK
+    assert response.body == {
+        key: movies.expected_film_by_id[key] for key in ("uuid", "title", "genres")
+    }
+
+
+async def test_film_by_id_unknown_fields(make_get_request):
+    response = await make_get_request(
+        "films/1f6546ba-b298-11ec-90b3-00155db24537",
+        params={"fields[film]": "title,budget"},
+    )
+
+    assert response.status == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
 @pytest.mark.parametrize(
     "page_num,page_size,expected_resp", TEST_FILMS_PAGINATION_DATA, ids=filter_int
 )
@@ -69,3 +90,78 @@ async def test_films_check_all_films(make_get_request):
     assert isinstance(resp_all_films.body, list)
     assert len(resp_all_films.body) == 6
     assert resp_all_films.body == movies.expected_films_check_all
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"page[size]": 0},
+        {"page[size]": 1001},
+        {"page[number]": 0},
+        {"page[number]": -1},
+        {"page[size]": 0, "page[after]": ""},
+    ],
+)
+async def test_films_invalid_page(params, make_get_request):
+    response = await make_get_request(
+        "films", params={"sort": "-imdb_rating", **params}
+    )
+
+    assert response.status == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+async def test_films_cursor_walks_all_films(make_get_request):
+    params = {"sort": "imdb_rating", "page[size]": 4, "page[after]": ""}
+    first = await make_get_request("films", params=params)
+
+    assert first.status == HTTPStatus.OK
+    assert len(first.body["items"]) == 4
+    assert first.body["next"] is not None
+
+    second = await make_get_request(
+        "films", params={**params, "page[after]": first.body["next"]}
+    )
+
+    assert second.status == HTTPStatus.OK
+    assert second.body["next"] is None
+    assert first.body["items"] + second.body["items"] == (
+        movies.expected_films_check_all
+    )
+
+
+async def test_films_cursor_of_another_query(make_get_request):
+    first = await make_get_request(
+        "films", params={"sort": "imdb_rating", "page[size]": 2, "page[after]": ""}
+    )
+    resp = await make_get_request(
+        "films", params={"sort": "-imdb_rating", "page[after]": first.body["next"]}
+    )
+
+    assert resp.status == HTTPStatus.BAD_REQUEST
+
+
+async def test_films_batch(make_get_request):
+    ids = [
+        "1f6546ba-b298-11ec-90b3-00155db24537",
+        "1f6546ba-0000-11ec-90b3-00155db24537",
+        "1f650754-b298-11ec-90b3-00155db24537",
+    ]
+    response = await make_get_request("films/batch", params={"ids": ",".join(ids)})
+
+    assert response.status == HTTPStatus.OK
+    assert response.body[0] == movies.expected_film_by_id
+    assert response.body[1] is None
+    assert response.body[2]["uuid"] == ids[2]
+
+
+async def test_films_export(make_get_request):
+    response = await make_get_request(
+        "films/export", params={"format": "json", "fields[film]": "title"}
+    )
+
+    assert response.status == HTTPStatus.OK
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert sorted(film["uuid"] for film in response.body) == sorted(
+        film["id"] for film in movies.movies
+    )
+    assert all(set(film) == {"uuid", "title"} for film in response.body)
@@ -0,0 +1,59 @@
+import asyncio
+from http import HTTPStatus
+from uuid import uuid4
+
+import pytest
+from settings import TestSettings
+from test_data import movies
+from utils import es_load, with_person_ids
+
+# All test coroutines will be treated as marked with this decorator.
+pytestmark = pytest.mark.asyncio
+
+SETTINGS = TestSettings()
+
+
+async def test_repeated_absent_film(make_get_request):
+    film_id = str(uuid4())
+    first = await make_get_request(f"films/{film_id}")
+    second = await make_get_request(f"films/{film_id}")
+
+    assert first.status == HTTPStatus.NOT_FOUND
+    assert second.status == HTTPStatus.NOT_FOUND
+    assert second.body == first.body
+
+
+async def test_film_added_after_not_found(make_get_request, es_client):
+    film = with_person_ids({**movies.movies[0], "id": str(uuid4())})
+    response = await make_get_request(f"films/{film['id']}")
+
+    assert response.status == HTTPStatus.NOT_FOUND
+
+    await es_load(es_client, "movies", [film])
+    # the api sees new index data after its version poll
+    for _ in range(SETTINGS.service_wait_timeout):
+        response = await make_get_request(f"films/{film['id']}")
+        if response.status == HTTPStatus.OK:
+            break
+        await asyncio.sleep(SETTINGS.service_wait_interval)
+
+    assert response.status == HTTPStatus.OK
+    assert response.body["uuid"] == film["id"]
+
+    await es_client.delete(index="movies", id=film["id"], refresh=True)
+
+
+async def test_absent_film_rejected_by_bloom_filter(make_get_request, redis_client):
+    # ids rejected by the filter of current data never reach not found cache,
+    # until the filter is built every 404 is remembered there
+    for _ in range(SETTINGS.service_wait_timeout):
+        film_id = str(uuid4())
+        response = await make_get_request(f"films/{film_id}")
+        assert response.status == HTTPStatus.NOT_FOUND
+        if not await redis_client.keys(f"not-found:movies:*:{film_id}"):
+            break
+        await asyncio.sleep(SETTINGS.service_wait_interval)
+    else:
+        pytest.fail("bloom filter of movies is not built")
+
+    assert await redis_client.exists("not-found:bloom:movies")
@@ -0,0 +1,58 @@
+import asyncio
+from http import HTTPStatus
+
+import pytest
+import pytest_asyncio
+from settings import TestSettings
+from test_data import constants, movies
+from utils import es_load, filter_uuid, with_person_ids
+
+# All test coroutines will be treated as marked with this decorator.
+pytestmark = pytest.mark.asyncio
+
+SETTINGS = TestSettings()
+
+PERSON_ID = "1f64ea08-b298-11ec-90b3-00155db24537"
+VERSION_BUMP_KEY = "index-version:movies:bump"
+
+
+async def recreate_movies(es_client, mappings: dict, data: list[dict]) -> None:
+    await es_client.indices.delete(index="movies")
+    await es_client.indices.create(
+        index="movies", settings=constants.settings, mappings=mappings
+    )
+    await es_load(es_client, "movies", data)
+
+
+@pytest_asyncio.fixture
+async def movies_without_person_ids(es_client, es_load_data, redis_client):
+    """movies index created before `person_ids` was mapped"""
+    properties = dict(constants.mappings_movies["properties"])
+    del properties["person_ids"]
+    await recreate_movies(
+        es_client,
+        {**constants.mappings_movies, "properties": properties},
+        movies.movies,
+    )
+    await redis_client.incr(VERSION_BUMP_KEY)
+    yield
+    await recreate_movies(
+        es_client,
+        constants.mappings_movies,
+        [with_person_ids(movie) for movie in movies.movies],
+    )
+    await redis_client.incr(VERSION_BUMP_KEY)
+
+
+async def test_person_films_of_index_without_person_ids(
+    movies_without_person_ids, make_get_request
+):
+    # the api queries nested roles once it sees the new index version
+    for _ in range(SETTINGS.service_wait_timeout):
+        response = await make_get_request(f"persons/{PERSON_ID}/films")
+        if response.status == HTTPStatus.OK and response.body:
+            break
+        await asyncio.sleep(SETTINGS.service_wait_interval)
+
+    assert response.status == HTTPStatus.OK
+    assert filter_uuid(response.body) == {movie["id"] for movie in movies.movies}
@@ -0,0 +1,61 @@
+import asyncio
+from http import HTTPStatus
+from typing import Optional
+
+import pytest
+from settings import TestSettings
+from test_data import movies
+
+# All test coroutines will be treated as marked with this decorator.
+pytestmark = pytest.mark.asyncio
+
+SETTINGS = TestSettings()
+
+DRAMA_ID = "1f64e81e-b298-11ec-90b3-00155db24537"
+
+
+async def es_ranked_ids(es_client, order: str, genre_id: Optional[str]) -> list[str]:
+    query = {"match_all": {}}
+    if genre_id is not None:
+        query = {
+            "nested": {"path": "genres", "query": {"term": {"genres.id": genre_id}}}
+        }
+    resp = await es_client.search(
+        index="movies",
+        query=query,
+        sort=[{"imdb_rating": {"order": order}}, {"id": {"order": "asc"}}],
+        size=len(movies.movies),
+        source=False,
+    )
+    return [hit["_id"] for hit in resp["hits"]["hits"]]
+
+
+@pytest.mark.parametrize(
+    "sort,order", [("imdb_rating", "desc"), ("-imdb_rating", "asc")]
+)
+@pytest.mark.parametrize("genre_id", [None, DRAMA_ID])
+async def test_ranked_pages_match_es(
+    sort, order, genre_id, make_get_request, es_client, redis_client
+):
+    # wait until rankings are built for the loaded films
+    for _ in range(SETTINGS.service_wait_timeout):
+        if await redis_client.zcard(f"film-rankings:{order}:all") == len(movies.movies):
+            break
+        await asyncio.sleep(SETTINGS.service_wait_interval)
+
+    params = {"sort": sort, "page[size]": 2}
+    if genre_id is not None:
+        params["filter[genre]"] = genre_id
+    ids, number = [], 1
+    while True:
+        response = await make_get_request(
+            "films", params={**params, "page[number]": number}
+        )
+        assert response.status == HTTPStatus.OK
+        if not response.body:
+            break
+        ids += [film["uuid"] for film in response.body]
+        number += 1
+
+    # ties of rating (10.0, 9.9) are ordered by id
+    assert ids == await es_ranked_ids(es_client, order, genre_id)
@@ -42,6 +42,7 @@ mappings_movies = {
         "directors_names": {"type": "text", "analyzer": "ru_en"},
         "actors_names": {"type": "text", "analyzer": "ru_en"},
         "writers_names": {"type": "text", "analyzer": "ru_en"},
+        "person_ids": {"type": "keyword"},
         "genres": {
             "type": "nested",
             "dynamic": "strict",
@@ -14,6 +14,12 @@ async def es_load(
     await es_client.indices.refresh(index=index)
 
 
+def with_person_ids(movie: dict) -> dict:
+    """Movie document with denormalized ids of all its persons"""
+    persons = movie["actors"] + movie["directors"] + movie["writers"]
+    return {**movie, "person_ids": list(dict.fromkeys(p["id"] for p in persons))}
+
+
 def filter_uuid(data):
     return set([i["uuid"] for i in data])
 